@@ -1,16 +1,263 @@
 #!/usr/bin/env python3
+import argparse
+import asyncio
+import base64
+import contextlib
+import cProfile
+import csv
+import functools
+import gzip
+import hashlib
+import importlib.util
+import json
 import os
+import posixpath
+import pstats
+import re
+import shutil
+import sys
+import tarfile
+import tempfile
 import textwrap
-from urllib.parse import quote
+import threading
+import time
+import tracemalloc
+import zipfile
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import asdict, dataclass
+from itertools import islice
+from typing import NamedTuple
+from html import escape
+from html.parser import HTMLParser
+from io import BytesIO
+from urllib.parse import quote, urlsplit
+
+try:
+    import brotli
+except ImportError:  # optional: only needed for --precompress br
+    brotli = None
+
+try:
+    from fontTools import subset as ft_subset
+    from fontTools.ttLib import TTFont
+except ImportError:  # optional: without it --vendor-dir copies fonts unsubsetted
+    ft_subset = None
 
 ROOT = "/workspace"
 OUT_DIR = ROOT
+MANIFEST_NAME = ".build-manifest.json"
+ASSETS_DIR = "assets"
+VENDOR_OUT = "vendor"
+
+
+def _source_hash() -> str:
+    with open(__file__, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()[:16]
+
+
+# Any edit to the generator invalidates every manifest entry.
+GENERATOR_VERSION = _source_hash()
 
 
 def ensure_dir(path: str):
     os.makedirs(path, exist_ok=True)
 
 
+def _batched(iterable, n: int):
+    # itertools.batched is 3.12+.
+    it = iter(iterable)
+    while batch := tuple(islice(it, n)):
+        yield batch
+
+
+# --- Profiling ---------------------------------------------------------------
+# --profile installs a TraceRecorder; span() is a no-op context manager otherwise.
+
+class TraceRecorder:
+    # Chrome trace-event "complete" events (open in chrome://tracing or Perfetto),
+    # each carrying the peak memory allocated inside the span, above what was
+    # already traced when it started.
+    def __init__(self):
+        self.events = []
+        self.origin = time.perf_counter()
+        self._frames = []  # [traced bytes at start, absolute peak so far] per open span
+
+    @contextlib.contextmanager
+    def span(self, name: str, cat: str, args: dict):
+        current, peak = tracemalloc.get_traced_memory()
+        if self._frames:
+            self._frames[-1][1] = max(self._frames[-1][1], peak)
+        tracemalloc.reset_peak()
+        self._frames.append([current, current])
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            end = time.perf_counter()
+            base, peak = self._frames.pop()
+            peak = max(peak, tracemalloc.get_traced_memory()[1])
+            if self._frames:
+                self._frames[-1][1] = max(self._frames[-1][1], peak)
+            self.events.append({
+                "name": name, "cat": cat, "ph": "X", "pid": os.getpid(), "tid": threading.get_ident(),
+                "ts": round((start - self.origin) * 1e6, 1), "dur": round((end - start) * 1e6, 1),
+                "args": dict(args, peak_kib=round((peak - base) / 1024, 1)),
+            })
+
+    def save(self, path: str):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"traceEvents": self.events, "displayTimeUnit": "ms"}, f)
+
+    def totals(self) -> list:
+        # (cat, name, count, total seconds, max peak KiB), slowest first.
+        rows = {}
+        for e in self.events:
+            count, total, peak = rows.get((e["cat"], e["name"]), (0, 0.0, 0.0))
+            rows[(e["cat"], e["name"])] = (count + 1, total + e["dur"] / 1e6, max(peak, e["args"]["peak_kib"]))
+        return sorted(((cat, name, *row) for (cat, name), row in rows.items()), key=lambda r: -r[3])
+
+
+PROFILER = None
+_NO_SPAN = contextlib.nullcontext()
+
+
+def span(name: str, cat: str = "stage", **args):
+    return PROFILER.span(name, cat, args) if PROFILER is not None else _NO_SPAN
+
+
+@contextlib.contextmanager
+def profiling(path: str, top: int = 20):
+    global PROFILER
+    PROFILER = TraceRecorder()
+    profile = cProfile.Profile()
+    tracemalloc.start()
+    profile.enable()
+    try:
+        with span("build", "build"):
+            yield
+    finally:
+        profile.disable()
+        tracemalloc.stop()
+        recorder, PROFILER = PROFILER, None
+        recorder.save(path)
+        print(f"\n{'span':<28} {'count':>7} {'total s':>9} {'peak KiB':>10}")
+        for cat, name, count, total, peak in recorder.totals():
+            print(f"{cat + ':' + name:<28} {count:>7} {total:>9.3f} {peak:>10.1f}")
+        print(f"\nTop {top} functions by own time:")
+        stats = pstats.Stats(profile, stream=sys.stdout)
+        stats.sort_stats(pstats.SortKey.TIME).print_stats(top)
+        print(f"Wrote trace to {path}")
+
+
+# --- Minification ------------------------------------------------------------
+
+HTML_BLOCK_TAGS = frozenset("""
+    !doctype html head meta link title style script body header nav main section div footer
+    ul li h1 h2 h3 p pre svg defs g lineargradient stop rect circle text filter fedropshadow
+""".split())
+_CSS_TOKENS = re.compile(r"""("(?:\\.|[^"\\])*"|'(?:\\.|[^'\\])*'|/\*.*?\*/)""", re.S)
+_JS_TOKENS = re.compile(r"""("(?:\\.|[^"\\\n])*"|'(?:\\.|[^'\\\n])*'|`(?:\\.|[^`\\])*`|/\*.*?\*/|//[^\n]*)""", re.S)
+_HTML_GAP = re.compile(r"(<(/?)([!a-zA-Z][\w-]*)[^>]*>)\s+(?=<(/?)([!a-zA-Z][\w-]*))")
+_HTML_RAW = re.compile(r"(<(pre|script|style|textarea)\b[^>]*>)(.*?)(</\2>)", re.S | re.I)
+_CSS_SPACE = re.compile(r"\s+")
+_CSS_PUNCT = re.compile(r"\s*([{};,>])\s*")
+_CSS_COLON = re.compile(r":\s+")
+_CSS_HEX6 = re.compile(r"#([0-9a-fA-F]{6})\b")
+_CSS_ZERO = re.compile(r"(?<![\w.-])0+\.(\d)")
+
+
+def minify_svg(svg: str) -> str:
+    svg = re.sub(r">\s+<", "><", svg.strip())
+    return re.sub(r"\s+", " ", svg).replace(" />", "/>")
+
+
+def prepare_svg(svg: str, minify: bool) -> str:
+    return minify_svg(svg) if minify else svg
+
+
+def _shorten_hex(m) -> str:
+    h = m.group(1)
+    if h[0] == h[1] and h[2] == h[3] and h[4] == h[5]:
+        return "#" + h[0] + h[2] + h[4]
+    return m.group(0)
+
+
+def _minify_css_code(code: str) -> str:
+    code = _CSS_SPACE.sub(" ", code)
+    code = _CSS_PUNCT.sub(r"\1", code)
+    code = _CSS_COLON.sub(":", code)
+    code = _CSS_HEX6.sub(_shorten_hex, code)
+    code = _CSS_ZERO.sub(r".\1", code)
+    return code.replace(";}", "}")
+
+
+def minify_css(css: str) -> str:
+    # Comments become plain whitespace first, so the code on either side of one is
+    # minified as a single piece; strings are kept verbatim.
+    out = []
+    code = []
+    for i, part in enumerate(_CSS_TOKENS.split(css)):
+        if i % 2 and not part.startswith("/*"):
+            out.append(_minify_css_code("".join(code)))
+            out.append(part)
+            code = []
+        else:
+            code.append(" " if i % 2 else part)
+    out.append(_minify_css_code("".join(code)))
+    return "".join(out).strip().replace(";}", "}")
+
+
+def minify_js(js: str) -> str:
+    # Comments go, indentation and blank lines go; newlines stay so ASI is untouched.
+    out = []
+    for i, part in enumerate(_JS_TOKENS.split(js)):
+        if i % 2:
+            if not part.startswith(("//", "/*")):
+                out.append(part)
+        else:
+            out.append(re.sub(r"[ \t]*\n\s*", "\n", re.sub(r"[ \t]+", " ", part)))
+    return "\n".join(line for line in "".join(out).split("\n") if line.strip()).strip() + "\n"
+
+
+def _html_gap(m) -> str:
+    if m.group(3).lower() in HTML_BLOCK_TAGS or m.group(5).lower() in HTML_BLOCK_TAGS:
+        return m.group(1)
+    return m.group(1) + " "
+
+
+def minify_html(html: str) -> str:
+    # Raw-text bodies are set aside so whitespace collapsing cannot touch them.
+    raw = []
+
+    def stash(m):
+        tag, body = m.group(2).lower(), m.group(3)
+        if tag == "style":
+            body = minify_css(body)
+        elif tag == "script" and body.strip():
+            body = minify_js(body).strip()
+        raw.append(body)
+        return f"{m.group(1)}\x00{len(raw) - 1}\x00{m.group(4)}"
+
+    html = _HTML_RAW.sub(stash, html)
+    html = _HTML_GAP.sub(_html_gap, re.sub(r"\s+", " ", html).strip())
+    html = re.sub(r"\s+/>", "/>", html)
+    html = re.sub(r"\x00(\d+)\x00", lambda m: raw[int(m.group(1))], html)
+    return html.replace("<style></style>", "") + "\n"
+
+
+@functools.lru_cache(maxsize=256)
+def minify_output(name: str, data: str) -> str:
+    # Cached: script.js and the shared sheets repeat across every template.
+    if name.endswith(".html"):
+        return minify_html(data)
+    if name.endswith(".css"):
+        return minify_css(data) + "\n"
+    if name.endswith(".js"):
+        return minify_js(data)
+    return data
+
+
 def svg_favicon_svg(primary: str, accent: str, letter: str) -> str:
     return f'''<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 64 64">
   <defs>
@@ -24,18 +271,20 @@ def svg_favicon_svg(primary: str, accent: str, letter: str) -> str:
   <circle cx="44" cy="46" r="5" fill="rgba(255,255,255,0.3)"/>
   <text x="50%" y="57%" text-anchor="middle" dominant-baseline="middle"
         font-family="'Inter', system-ui, -apple-system, Segoe UI, Roboto, Ubuntu, Cantarell, Noto Sans, Helvetica Neue, Arial, 'Apple Color Emoji', 'Segoe UI Emoji'"
-        font-size="32" font-weight="800" fill="white">{letter}</text>
+        font-size="32" font-weight="800" fill="white">{escape(letter)}</text>
 </svg>'''
 
 
-def inline_favicon_data_uri(primary: str, accent: str, letter: str) -> str:
-    svg = svg_favicon_svg(primary, accent, letter)
-    return f"data:image/svg+xml;utf8,{quote(svg)}"
+@functools.lru_cache(maxsize=4096)
+def inline_favicon_data_uri(primary: str, accent: str, letter: str, minify: bool = False) -> str:
+    with span("favicon"):
+        svg = prepare_svg(svg_favicon_svg(primary, accent, letter), minify)
+        return f"data:image/svg+xml;utf8,{quote(svg)}"
 
 
 def inline_logo_svg(primary: str, accent: str, brand: str) -> str:
     initials = ''.join([w[0] for w in brand.split()[:2]]).upper()
-    return f'''<svg class="logo-svg" width="144" height="44" viewBox="0 0 144 44" fill="none" xmlns="http://www.w3.org/2000/svg" aria-label="{brand} logo">
+    return f'''<svg class="logo-svg" width="144" height="44" viewBox="0 0 144 44" fill="none" xmlns="http://www.w3.org/2000/svg" aria-label="{escape(brand)} logo">
   <defs>
     <linearGradient id="lg" x1="0" y1="0" x2="1" y2="1">
       <stop offset="0%" stop-color="{primary}"/>
@@ -46,9 +295,9 @@ def inline_logo_svg(primary: str, accent: str, brand: str) -> str:
     </filter>
   </defs>
   <rect x="0" y="2" rx="12" ry="12" width="44" height="40" fill="url(#lg)" filter="url(#shadow)"/>
-  <text x="22" y="28" text-anchor="middle" dominant-baseline="middle" font-family="Inter, system-ui, -apple-system, Segoe UI, Roboto, Ubuntu, Cantarell, Noto Sans, Helvetica Neue, Arial" font-size="20" font-weight="800" fill="#fff">{initials}</text>
+  <text x="22" y="28" text-anchor="middle" dominant-baseline="middle" font-family="Inter, system-ui, -apple-system, Segoe UI, Roboto, Ubuntu, Cantarell, Noto Sans, Helvetica Neue, Arial" font-size="20" font-weight="800" fill="#fff">{escape(initials)}</text>
   <g transform="translate(56,6)">
-    <text x="0" y="22" font-family="Inter, system-ui, -apple-system, Segoe UI, Roboto, Ubuntu, Cantarell, Noto Sans, Helvetica Neue, Arial" font-size="22" font-weight="900" fill="url(#lg)">{brand}</text>
+    <text x="0" y="22" font-family="Inter, system-ui, -apple-system, Segoe UI, Roboto, Ubuntu, Cantarell, Noto Sans, Helvetica Neue, Arial" font-size="22" font-weight="900" fill="url(#lg)">{escape(brand)}</text>
   </g>
   <g opacity="0.25">
     <circle cx="128" cy="8" r="4" fill="{accent}"/>
@@ -154,202 +403,500 @@ niches = [
 ]
 
 
-def make_html(idx: int, slug: str, brand: str, tagline: str, letter: str) -> str:
-    pal = palettes[idx % len(palettes)]
-    primary, accent = pal
-    font = google_fonts[idx % len(google_fonts)]
-    variant = variants[idx % len(variants)]
-    favicon_uri = inline_favicon_data_uri(primary, accent, letter[0] if letter else brand[0])
-    logo_svg = inline_logo_svg(primary, accent, brand)
-    # Icon CDN
-    icons = [
-        "https://unpkg.com/boxicons@2.1.4/css/boxicons.min.css",
-        "https://cdn.jsdelivr.net/npm/remixicon@4.3.0/fonts/remixicon.css"
-    ]
-    # Decorative label
-    vibe = variant.capitalize()
-    
-    html = f"""<!doctype html>
-<html lang=\"en\">
+# --- Brand catalogs ------------------------------------------------------------
+# CSV (with a header row) or JSONL, one brand per row:
+#   slug, brand, tagline, letter          required (letter may be empty)
+#   palette, font, variant                optional overrides, e.g. "#7F00FF #E100FF",
+#                                         "Inter:wght@400;600;800", "neon"
+#   host                                  optional, for server-config (default <slug>.<domain>)
+
+CATALOG_FIELDS = ("slug", "brand", "tagline", "letter", "palette", "font", "variant", "host")
+SLUG_RE = re.compile(r"[a-z0-9]+(?:-[a-z0-9]+)*")
+HEX_COLOR_RE = re.compile(r"#(?:[0-9a-fA-F]{3}){1,2}")
+FONT_SPEC_RE = re.compile(r"[A-Za-z0-9+]+(?::wght@\d+(?:;\d+)*)?")
+HOST_RE = re.compile(r"(?=.{1,253}$)[a-z0-9](?:[a-z0-9-]{0,61}[a-z0-9])?(?:\.[a-z0-9](?:[a-z0-9-]{0,61}[a-z0-9])?)*")
+
+
+class Brand(NamedTuple):
+    slug: str
+    brand: str
+    tagline: str
+    letter: str
+    palette: tuple = None
+    font: str = None
+    variant: str = None
+    host: str = None
+
+
+class CatalogError(ValueError):
+    def __init__(self, path: str, line: int, message: str):
+        super().__init__(f"{path}:{line}: {message}")
+        self.path = path
+        self.line = line
+
+
+def default_catalog():
+    return (Brand(*niche) for niche in niches)
+
+
+def parse_brand(record: dict, path: str, line: int) -> Brand:
+    def fail(message):
+        raise CatalogError(path, line, message)
+
+    if None in record:
+        fail("row has more columns than the header")
+    unknown = set(record) - set(CATALOG_FIELDS)
+    if unknown:
+        fail(f"unknown field(s): {', '.join(sorted(unknown))}")
+    values = {}
+    for field in CATALOG_FIELDS:
+        value = record.get(field)
+        if value is None or value == "":
+            values[field] = None
+        elif field == "palette" and isinstance(value, list):
+            values[field] = value
+        elif not isinstance(value, str):
+            fail(f"{field} must be a string, got {type(value).__name__}")
+        else:
+            values[field] = value.strip()
+    for field in ("slug", "brand", "tagline"):
+        if not values[field]:
+            fail(f"missing required field {field!r}")
+    if not SLUG_RE.fullmatch(values["slug"]):
+        fail(f"invalid slug {values['slug']!r} (lowercase letters, digits and single dashes)")
+    palette = values["palette"]
+    if palette is not None:
+        colors = palette if isinstance(palette, list) else re.split(r"[\s,/]+", palette)
+        if len(colors) != 2 or not all(isinstance(c, str) and HEX_COLOR_RE.fullmatch(c) for c in colors):
+            fail(f"palette must be two hex colors, got {palette!r}")
+        palette = tuple(colors)
+    if values["font"] is not None and not FONT_SPEC_RE.fullmatch(values["font"]):
+        fail(f"font must look like a Google Fonts family spec (e.g. Inter:wght@400;700), got {values['font']!r}")
+    if values["variant"] is not None and values["variant"] not in variants:
+        fail(f"unknown variant {values['variant']!r} (choose from {', '.join(variants)})")
+    if values["host"] is not None and not HOST_RE.fullmatch(values["host"]):
+        fail(f"host must be a lowercase hostname, got {values['host']!r}")
+    return Brand(values["slug"], values["brand"], values["tagline"], values["letter"] or "",
+                 palette, values["font"], values["variant"], values["host"])
+
+
+def iter_catalog(path: str):
+    # Lazily yields Brand records; memory use does not grow with the catalog.
+    seen = set()
+    with open(path, newline="", encoding="utf-8") as f:
+        if path.endswith(".jsonl"):
+            rows = ((n, line) for n, line in enumerate(f, 1) if line.strip())
+            records = ((n, _json_record(line, path, n)) for n, line in rows)
+        else:
+            reader = csv.DictReader(f)
+            missing = {"slug", "brand", "tagline"} - set(reader.fieldnames or ())
+            if missing:
+                raise CatalogError(path, 1, f"header is missing column(s): {', '.join(sorted(missing))}")
+            records = ((reader.line_num, row) for row in reader)
+        for line, record in records:
+            brand = parse_brand(record, path, line)
+            if brand.slug in seen:
+                raise CatalogError(path, line, f"duplicate slug {brand.slug!r}")
+            seen.add(brand.slug)
+            yield brand
+
+
+def _json_record(line: str, path: str, n: int) -> dict:
+    try:
+        record = json.loads(line)
+    except ValueError as e:
+        raise CatalogError(path, n, f"invalid JSON: {e}") from None
+    if not isinstance(record, dict):
+        raise CatalogError(path, n, "each line must be a JSON object")
+    return record
+
+
+ICON_CDN = [
+    "https://unpkg.com/boxicons@2.1.4/css/boxicons.min.css",
+    "https://cdn.jsdelivr.net/npm/remixicon@4.3.0/fonts/remixicon.css"
+]
+
+
+class Template:
+    # A page split once into literal segments and {{slot}} names, so rendering is a
+    # single join. Slots passed to the constructor are baked into the literals.
+    SLOT_RE = re.compile(r"\{\{\s*(\w+)\s*\}\}")
+
+    def __init__(self, source: str, **baked):
+        parts = self.SLOT_RE.split(source)
+        self.segments = [parts[0]]
+        self.slots = []
+        for name, text in zip(parts[1::2], parts[2::2]):
+            if name in baked:
+                self.segments[-1] += baked[name] + text
+            else:
+                self.slots.append(name)
+                self.segments.append(text)
+
+    def render(self, **values) -> str:
+        out = [self.segments[0]]
+        for name, text in zip(self.slots, self.segments[1:]):
+            value = values.get(name)
+            if not isinstance(value, str):
+                raise TypeError(f"template slot {name!r} needs a str, got {type(value).__name__}")
+            out.append(value)
+            out.append(text)
+        return "".join(out)
+
+
+CDN_HEAD = Template("""<link rel="preconnect" href="https://fonts.googleapis.com" />
+  <link rel="preconnect" href="https://fonts.gstatic.com" crossorigin />
+  <link href="https://fonts.googleapis.com/css2?family={{font}}&display=swap" rel="stylesheet" />
+  {{icon_links}}""", icon_links=''.join([f'<link rel="stylesheet" href="{u}" />' for u in ICON_CDN]))
+
+
+PAGE_SOURCE = """<!doctype html>
+<html lang="{{lang}}">
 <head>
-  <meta charset=\"utf-8\" />
-  <meta name=\"viewport\" content=\"width=device-width, initial-scale=1\" />
-  <title>404 — {brand}</title>
-  <meta name=\"description\" content=\"{tagline}\" />
-  <link rel=\"icon\" type=\"image/svg+xml\" href=\"{favicon_uri}\" />
-  <link rel=\"preconnect\" href=\"https://fonts.googleapis.com\" />
-  <link rel=\"preconnect\" href=\"https://fonts.gstatic.com\" crossorigin />
-  <link href=\"https://fonts.googleapis.com/css2?family={font}&display=swap\" rel=\"stylesheet\" />
-  {''.join([f'<link rel="stylesheet" href="{u}" />' for u in icons])}
-  <link rel=\"stylesheet\" href=\"style.css\" />
-  <script defer src=\"script.js\"></script>
+  <meta charset="utf-8" />{{base_tag}}
+  <meta name="viewport" content="width=device-width, initial-scale=1" />
+  <title>404 — {{brand}}</title>
+  <meta name="description" content="{{tagline}}" />
+  <link rel="icon" type="image/svg+xml" href="{{favicon_uri}}" />
+  {{third_party}}
+  {{stylesheet_links}}
+  {{script_tag}}
   <style>
-    /* Variant helper for {vibe} */
+    /* Variant helper for {{vibe}} */{{page_css}}
   </style>
-  <meta name=\"theme-color\" content=\"{primary}\" />
-  <meta name=\"color-scheme\" content=\"light dark\" />
-  <meta name=\"robots\" content=\"noindex\" />
-  <meta property=\"og:title\" content=\"404 — {brand}\" />
-  <meta property=\"og:description\" content=\"{tagline}\" />
-  <meta property=\"og:type\" content=\"website\" />
+  <meta name="theme-color" content="{{primary}}" />
+  <meta name="color-scheme" content="light dark" />
+  <meta name="robots" content="noindex" />
+  <meta property="og:title" content="404 — {{brand}}" />
+  <meta property="og:description" content="{{tagline}}" />
+  <meta property="og:type" content="website" />
 </head>
-<body class=\"variant-{variant}\" data-brand=\"{brand}\" data-slug=\"{slug}\">
-  <header class=\"site-header\">
-    <a href=\"#\" class=\"brand\" aria-label=\"{brand} home\">{logo_svg}</a>
-    <nav class=\"quick\" aria-label=\"Quick links\">
-      <a href=\"#\" class=\"nav-link\"><i class=\"bx bx-help-circle\"></i> Help Center</a>
-      <a href=\"#\" class=\"nav-link\"><i class=\"bx bx-message-dots\"></i> Contact</a>
-      <button class=\"theme-toggle\" aria-label=\"Toggle theme\"><i class=\"bx bx-moon\"></i></button>
+<body class="variant-{{variant}}" data-brand="{{brand}}" data-slug="{{slug}}">
+  <header class="site-header">
+    <a href="{{link_href}}" class="brand" aria-label="{{brand}} home">{{logo_svg}}</a>
+    <nav class="quick" aria-label="Quick links">
+      <a href="{{link_href}}" class="nav-link"><i class="bx bx-help-circle"></i> Help Center</a>
+      <a href="{{link_href}}" class="nav-link"><i class="bx bx-message-dots"></i> Contact</a>
+      <button class="theme-toggle" aria-label="Toggle theme">{{toggle_icon}}</button>
     </nav>
   </header>
 
-  <main class=\"hero\" role=\"main\">
-    <div class=\"decor\" aria-hidden=\"true\"></div>
-    <section class=\"content\">
-      <div class=\"eyebrow\">{vibe} · {slug.replace('-', ' ').title()}</div>
-      <h1 class=\"title\"><span class=\"num\">4</span><span class=\"num\">0</span><span class=\"num\">4</span></h1>
-      <p class=\"tagline\">We can't find the page you are looking for. {tagline}</p>
-      <div class=\"actions\">
-        <a class=\"btn primary\" href=\"#\"><i class=\"ri-arrow-left-line\"></i> Go Back</a>
-        <a class=\"btn ghost\" href=\"#\"><i class=\"ri-home-5-line\"></i> Homepage</a>
+  <main class="hero" role="main">
+    <div class="decor" aria-hidden="true"></div>
+    <section class="content">
+      <div class="eyebrow">{{vibe}} · {{slug_title}}</div>
+      <h1 class="title"><span class="num">4</span><span class="num">0</span><span class="num">4</span></h1>
+      <p class="tagline">We can't find the page you are looking for. {{tagline}}</p>
+      <div class="actions">
+        <a class="btn primary" href="{{link_href}}"><i class="ri-arrow-left-line"></i> Go Back</a>
+        <a class="btn ghost" href="{{link_href}}"><i class="ri-home-5-line"></i> Homepage</a>
       </div>
 
-      <div class=\"extras\">
-        <div class=\"chip\"><i class=\"bx bx-time-five\"></i> Redirect in <span id=\"counter\">10</span>s</div>
-        <div class=\"chip\"><i class=\"bx bx-bulb\"></i> Tip: Use search or our sitemap</div>
+      <div class="extras">
+        <div class="chip"><i class="bx bx-time-five"></i> Redirect in <span id="counter">{{counter}}</span>s</div>
+        <div class="chip"><i class="bx bx-bulb"></i> Tip: Use search or our sitemap</div>
       </div>
 
-      <div class=\"controls\">
-        <button class=\"ctrl\" data-action=\"pause\"><i class=\"ri-pause-mini-fill\"></i> Pause</button>
-        <button class=\"ctrl\" data-action=\"resume\"><i class=\"ri-play-mini-fill\"></i> Resume</button>
-        <button class=\"ctrl\" data-action=\"reset\"><i class=\"ri-restart-line\"></i> Reset</button>
+      <div class="controls">
+        {{controls}}
       </div>
     </section>
   </main>
 
-  <footer class=\"site-footer\">
-    <div class=\"cols\">
+  <footer class="site-footer">
+    <div class="cols">
       <div>
         <h3>Need help?</h3>
-        <p>Email support@{slug}.com or chat with us 24/7.</p>
+        <p>Email support@{{slug}}.com or chat with us 24/7.</p>
       </div>
       <ul>
-        <li><a href=\"#\">Status</a></li>
-        <li><a href=\"#\">Docs</a></li>
-        <li><a href=\"#\">Pricing</a></li>
+        <li><a href="{{link_href}}">Status</a></li>
+        <li><a href="{{link_href}}">Docs</a></li>
+        <li><a href="{{link_href}}">Pricing</a></li>
       </ul>
       <ul>
-        <li><a href=\"#\">Terms</a></li>
-        <li><a href=\"#\">Privacy</a></li>
-        <li><a href=\"#\">Security</a></li>
+        <li><a href="{{link_href}}">Terms</a></li>
+        <li><a href="{{link_href}}">Privacy</a></li>
+        <li><a href="{{link_href}}">Security</a></li>
       </ul>
     </div>
   </footer>
 </body>
 </html>
 """
-    return html
+PAGE_TEMPLATE = Template(PAGE_SOURCE)
+
+SCRIPT_CONTROLS = """<button class="ctrl" data-action="pause"><i class="ri-pause-mini-fill"></i> Pause</button>
+        <button class="ctrl" data-action="resume"><i class="ri-play-mini-fill"></i> Resume</button>
+        <button class="ctrl" data-action="reset"><i class="ri-restart-line"></i> Reset</button>"""
 
+# Zero-JS pages: the countdown is a CSS animation of a registered integer property,
+# pause/resume is a radio pair and reset a checkbox that swaps between two identical
+# keyframes (restarting the animation). The redirect itself is a meta refresh, which
+# CSS cannot hold back, so the controls are only offered when there is no redirect.
+STATIC_CONTROLS = """<label class="ctrl"><input type="radio" name="countdown" class="cd-pause"/><i class="ri-pause-mini-fill"></i> Pause</label>
+        <label class="ctrl"><input type="radio" name="countdown" class="cd-run" checked/><i class="ri-play-mini-fill"></i> Resume</label>
+        <label class="ctrl"><input type="checkbox" class="cd-reset"/><i class="ri-restart-line"></i> Reset</label>"""
 
-def make_css(idx: int) -> str:
+STATIC_PAGE_CSS = Template("""
+    @property --countdown { syntax: "<integer>"; inherits: false; initial-value: 10; }
+    @keyframes countdown { from { --countdown: 10; } to { --countdown: 0; } }
+    @keyframes countdown-restart { from { --countdown: 10; } to { --countdown: 0; } }
+    #counter { counter-reset: countdown var(--countdown); animation: countdown 10s steps(10, end) forwards; }
+    #counter::after { content: counter(countdown); }{{control_css}}
+    .theme-toggle .bx-sun { display: none; }
+    @media (prefers-color-scheme: dark) {
+      .theme-toggle .bx-moon { display: none; }
+      .theme-toggle .bx-sun { display: inline-block; }
+    }""")
+STATIC_CONTROLS_CSS = """
+    .content:has(.cd-pause:checked) #counter { animation-play-state: paused; }
+    .content:has(.cd-reset:checked) #counter { animation-name: countdown-restart; }
+    .controls input { position: absolute; opacity: 0; pointer-events: none; }"""
+
+
+class Theme(NamedTuple):
+    primary: str
+    accent: str
+    font: str
+    variant: str
+
+    @property
+    def font_family(self) -> str:
+        return self.font.split(':')[0].replace('+', ' ')
+
+
+def theme_for(idx: int, niche=None) -> Theme:
+    # Palette, font and variant cycle with the template index unless the catalog
+    # entry overrides them.
     primary, accent = palettes[idx % len(palettes)]
-    font_family = google_fonts[idx % len(google_fonts)].split(':')[0].replace('+', ' ')
+    font = google_fonts[idx % len(google_fonts)]
     variant = variants[idx % len(variants)]
-    return textwrap.dedent(f"""
-    :root {{
-      --primary: {primary};
-      --accent: {accent};
-      --bg: #0b0d12;
-      --card: rgba(255,255,255,0.06);
-      --text: #e6e7eb;
-      --muted: #a2a6b3;
-      --ring: color-mix(in oklab, var(--accent), white 20%);
-    }}
+    if niche is not None and len(niche) > 4:
+        primary, accent = niche.palette or (primary, accent)
+        font = niche.font or font
+        variant = niche.variant or variant
+    return Theme(primary, accent, font, variant)
 
-    * {{ box-sizing: border-box; }}
-    html, body {{ height: 100%; }}
-    body {{
-      margin: 0;
-      font-family: '{font_family}', system-ui, -apple-system, Segoe UI, Roboto, Ubuntu, Cantarell, Noto Sans, Helvetica Neue, Arial;
-      color: var(--text);
-      background: radial-gradient(1200px 800px at 85% -10%, color-mix(in oklab, var(--accent), #000 70%), transparent 60%),
-                  radial-gradient(900px 700px at -10% 120%, color-mix(in oklab, var(--primary), #000 70%), transparent 60%),
-                  #080a0f;
-      background-attachment: fixed;
-    }}
 
-    .site-header {{
-      display: flex; align-items: center; justify-content: space-between;
-      padding: 20px clamp(16px, 3vw, 40px);
-    }}
-    .brand {{ text-decoration: none; color: inherit; display: inline-flex; align-items: center; gap: 10px; }}
-    .logo-svg {{ display: block; }}
-    .quick {{ display: flex; align-items: center; gap: 14px; }}
-    .nav-link {{ color: var(--muted); text-decoration: none; font-weight: 600; }}
-    .nav-link:hover {{ color: var(--text); }}
-    .theme-toggle {{ background: transparent; border: 1px solid var(--card); color: var(--text); padding: 8px 10px; border-radius: 10px; cursor: pointer; }}
-
-    .hero {{ position: relative; min-height: calc(100vh - 120px); display: grid; place-items: center; padding: 40px 16px; }}
-    .content {{
-      width: min(960px, 100%);
-      background: {"backdrop-filter: blur(10px); background: color-mix(in oklab, var(--card), transparent 30%);" if variant in ['glass','soft'] else "transparent"};
-      border: 1px solid color-mix(in oklab, var(--card), transparent 20%);
-      border-radius: 24px;
-      padding: clamp(24px, 4vw, 56px);
-      position: relative;
-      z-index: 2;
-    }}
-    .eyebrow {{ color: var(--muted); text-transform: uppercase; letter-spacing: .18em; font-size: 12px; margin-bottom: 12px; }}
-    .title {{ font-size: clamp(64px, 14vw, 180px); line-height: .85; margin: 0; display: flex; gap: .1em; justify-content: center; font-weight: 900; background: linear-gradient(90deg, var(--primary), var(--accent)); -webkit-background-clip: text; background-clip: text; color: transparent; text-shadow: 0 10px 60px color-mix(in srgb, var(--accent), transparent 70%); }}
-    .tagline {{ color: var(--muted); font-size: clamp(14px, 2.2vw, 18px); max-width: 60ch; margin: 16px auto 24px; text-align: center; }}
-    .actions {{ display: flex; justify-content: center; gap: 12px; flex-wrap: wrap; }}
-    .btn {{ appearance: none; border: 0; padding: 12px 16px; border-radius: 14px; font-weight: 700; cursor: pointer; text-decoration: none; display: inline-flex; align-items: center; gap: 8px; }}
-    .btn.primary {{ background: linear-gradient(90deg, var(--primary), var(--accent)); color: #0b0d12; box-shadow: 0 10px 30px color-mix(in srgb, var(--accent), transparent 70%); }}
-    .btn.ghost {{ background: transparent; color: var(--text); border: 1px solid var(--card); }}
-
-    .extras {{ display: flex; justify-content: center; gap: 10px; flex-wrap: wrap; margin-top: 16px; }}
-    .chip {{ background: rgba(255,255,255,0.06); border: 1px solid var(--card); padding: 8px 12px; border-radius: 999px; color: var(--muted); font-weight: 600; }}
-
-    .controls {{ display: flex; justify-content: center; gap: 10px; margin-top: 18px; }}
-    .ctrl {{ background: rgba(255,255,255,0.06); color: var(--text); border: 1px solid var(--card); padding: 8px 12px; border-radius: 10px; cursor: pointer; }}
-    .ctrl:hover {{ border-color: var(--ring); }}
-
-    .site-footer {{ border-top: 1px solid var(--card); padding: 24px clamp(16px, 3vw, 40px); }}
-    .cols {{ display: grid; grid-template-columns: 2fr 1fr 1fr; gap: 20px; max-width: 1200px; margin: 0 auto; }}
-    .cols h3 {{ margin: 0 0 8px; }}
-    .cols ul {{ list-style: none; padding: 0; margin: 0; display: grid; gap: 8px; }}
-    .cols a {{ color: var(--muted); text-decoration: none; }}
-    .cols a:hover {{ color: var(--text); }}
-
-    .decor {{ position: absolute; inset: 0; pointer-events: none; z-index: 1; }}
-    body.variant-aurora .decor {{
-      background: conic-gradient(from 180deg at 70% 20%, color-mix(in oklab, var(--accent), transparent 70%), transparent),
-                  radial-gradient(600px 400px at 20% 80%, color-mix(in oklab, var(--primary), transparent 75%), transparent);
-      filter: blur(30px) saturate(120%);
-      opacity: .9;
-    }}
-    body.variant-neon .title {{ text-shadow: 0 0 10px color-mix(in srgb, var(--accent), transparent 40%), 0 0 40px color-mix(in srgb, var(--accent), transparent 60%); }}
-    body.variant-memphis .decor::before {{ content: ""; position: absolute; inset: 0; background-image: radial-gradient(circle at 20% 30%, rgba(255,255,255,0.08) 2px, transparent 3px), radial-gradient(circle at 60% 70%, rgba(255,255,255,0.06) 2px, transparent 3px); background-size: 24px 24px; }}
-    body.variant-waves .decor {{ background: linear-gradient(transparent 60%, rgba(255,255,255,0.06) 60%),
-      url('data:image/svg+xml;utf8,{quote("""
-      <svg xmlns=\"http://www.w3.org/2000/svg\" viewBox=\"0 0 1200 200\" preserveAspectRatio=\"none\">
-        <path d=\"M0,64 C300,160 900,0 1200,96 L1200,00 L0,0 Z\" fill=\"rgba(255,255,255,0.05)\"/>
-      </svg>
-      """.strip())}'); background-repeat: no-repeat; background-position: bottom; background-size: cover; }}
-    body.variant-retrogrid .decor {{ background-image: linear-gradient(rgba(255,255,255,0.06) 1px, transparent 1px), linear-gradient(90deg, rgba(255,255,255,0.06) 1px, transparent 1px); background-size: 40px 40px; mask-image: radial-gradient(circle at 60% 40%, #000 40%, transparent 70%); opacity: .6; }}
-    body.variant-split .content {{ display: grid; grid-template-columns: 1.1fr .9fr; align-items: center; gap: clamp(16px, 3vw, 40px); }}
-    body.variant-split .content::after {{ content: ""; display: block; height: 280px; border-radius: 20px; background: linear-gradient(180deg, color-mix(in oklab, var(--primary), transparent 40%), color-mix(in oklab, var(--accent), transparent 40%)); box-shadow: inset 0 0 0 1px var(--card), 0 20px 40px color-mix(in srgb, var(--accent), transparent 80%); }}
-    body.variant-cards .content {{ box-shadow: 0 20px 80px color-mix(in srgb, var(--accent), transparent 85%), inset 0 0 0 1px var(--card); }}
-
-    @media (max-width: 900px) {{
-      .cols {{ grid-template-columns: 1fr; }}
-      body.variant-split .content {{ grid-template-columns: 1fr; }}
+def make_html(idx: int, slug: str, brand: str, tagline: str, letter: str,
+              stylesheets=("style.css",), script: str = "script.js", vendored_css: str = None,
+              minify: bool = False, variant: str = None, lang: str = "en", theme: Theme = None,
+              redirect: str = "/", base_href: str = None, css: str = None, js: str = None) -> str:
+    # script=None renders the zero-JS page; redirect is only used by that page.
+    # base_href pins relative URLs when the page is shown as an error page elsewhere.
+    # css/js, when given, are inlined in place of the stylesheet links and script.
+    primary, accent, font, theme_variant = theme or theme_for(idx)
+    variant = variant or theme_variant
+    if vendored_css is None:
+        third_party = CDN_HEAD.render(font=font)
+    else:
+        third_party = f"<style>{vendored_css}</style>"
+    if css is None:
+        stylesheet_links = "\n  ".join([f'<link rel="stylesheet" href="{u}" />' for u in stylesheets])
+    else:
+        stylesheet_links = f"<style>\n{css}</style>"
+    slots = _script_slots(script) if script is not None else _static_slots(redirect)
+    if js is not None and script is not None:
+        # Inline module scripts run deferred, just like the external script.
+        escaped = js.replace("</", "<\\/")
+        slots["script_tag"] = f'<script type="module">{escaped}</script>'
+    return PAGE_TEMPLATE.render(
+        base_tag=f'\n  <base href="{base_href}" />' if base_href else "",
+        # Under <base>, "#" would point into the template tree; send placeholders home.
+        link_href="/" if base_href else "#",
+        # Catalog text is untrusted: escaped once here for both text and attributes.
+        lang=escape(lang),
+        brand=escape(brand),
+        tagline=escape(tagline),
+        slug=escape(slug),
+        slug_title=escape(slug.replace('-', ' ').title()),
+        primary=primary,
+        variant=variant,
+        # Decorative label
+        vibe=variant.capitalize(),
+        favicon_uri=inline_favicon_data_uri(primary, accent, letter[0] if letter else brand[0], minify),
+        logo_svg=inline_logo_svg(primary, accent, brand),
+        third_party=third_party,
+        stylesheet_links=stylesheet_links,
+        **slots,
+    )
+
+
+def _script_slots(script: str) -> dict:
+    return dict(script_tag=f'<script defer src="{script}"></script>', page_css="",
+                toggle_icon='<i class="bx bx-moon"></i>', counter="10", controls=SCRIPT_CONTROLS)
+
+
+def _static_slots(redirect: str) -> dict:
+    url = quote(redirect, safe=":/?#[]@!$&'()*+,;=%")
+    refresh = f'<meta http-equiv="refresh" content="10;url={url}" />' if redirect else ""
+    return dict(script_tag=refresh,
+                page_css=STATIC_PAGE_CSS.render(control_css="" if redirect else STATIC_CONTROLS_CSS),
+                toggle_icon='<i class="bx bx-moon"></i><i class="bx bx-sun"></i>', counter="",
+                controls="" if redirect else STATIC_CONTROLS)
+
+
+def content_background(variant: str) -> list:
+    # Declarations for the .content panel; glass and soft frost whatever is behind it.
+    if variant in ['glass', 'soft']:
+        return ["backdrop-filter: blur(10px)", "background: color-mix(in oklab, var(--card), transparent 30%)"]
+    return ["background: transparent"]
+
+
+def make_css(idx: int, minify: bool = False, variant: str = None, theme: Theme = None,
+             low_power: bool = False) -> str:
+    theme = theme or theme_for(idx)
+    variant = variant or theme.variant
+    theme_vars = f"  --primary: {theme.primary};\n  --accent: {theme.accent};\n"
+    content_bg = "".join(f"  {decl};\n" for decl in content_background(variant))
+    css = css_text(theme_vars, f"'{theme.font_family}'", content_bg, minify)
+    return css + low_power_css() if low_power else css
+
+
+def make_base_css(minify: bool = False, low_power: bool = False) -> str:
+    # Theme-independent stylesheet for --shared-assets; make_theme_css supplies the rest.
+    css = css_text("", "var(--font)", "", minify)
+    return css + low_power_css() if low_power else css
+
+
+def make_theme_css(idx: int, theme: Theme = None) -> str:
+    theme = theme or theme_for(idx)
+    return textwrap.dedent(f"""\
+    :root {{
+      --primary: {theme.primary};
+      --accent: {theme.accent};
+      --font: '{theme.font_family}';
     }}
+    .content {{ {'; '.join(content_background(theme.variant))}; }}
     """)
 
 
-def make_js() -> str:
-    return textwrap.dedent(
+CSS_SOURCE = """
+:root {
+{{theme_vars}}  --bg: #0b0d12;
+  --card: rgba(255,255,255,0.06);
+  --text: #e6e7eb;
+  --muted: #a2a6b3;
+  --ring: color-mix(in oklab, var(--accent), white 20%);
+}
+
+* { box-sizing: border-box; }
+html, body { height: 100%; }
+body {
+  margin: 0;
+  font-family: {{font}}, system-ui, -apple-system, Segoe UI, Roboto, Ubuntu, Cantarell, Noto Sans, Helvetica Neue, Arial;
+  color: var(--text);
+  background: radial-gradient(1200px 800px at 85% -10%, color-mix(in oklab, var(--accent), #000 70%), transparent 60%),
+              radial-gradient(900px 700px at -10% 120%, color-mix(in oklab, var(--primary), #000 70%), transparent 60%),
+              #080a0f;
+  background-attachment: fixed;
+}
+
+.site-header {
+  display: flex; align-items: center; justify-content: space-between;
+  padding: 20px clamp(16px, 3vw, 40px);
+}
+.brand { text-decoration: none; color: inherit; display: inline-flex; align-items: center; gap: 10px; }
+.logo-svg { display: block; }
+.quick { display: flex; align-items: center; gap: 14px; }
+.nav-link { color: var(--muted); text-decoration: none; font-weight: 600; }
+.nav-link:hover { color: var(--text); }
+.theme-toggle { background: transparent; border: 1px solid var(--card); color: var(--text); padding: 8px 10px; border-radius: 10px; cursor: pointer; }
+
+.hero { position: relative; min-height: calc(100vh - 120px); display: grid; place-items: center; padding: 40px 16px; }
+.content {
+  width: min(960px, 100%);
+{{content_bg}}  border: 1px solid color-mix(in oklab, var(--card), transparent 20%);
+  border-radius: 24px;
+  padding: clamp(24px, 4vw, 56px);
+  position: relative;
+  z-index: 2;
+}
+.eyebrow { color: var(--muted); text-transform: uppercase; letter-spacing: .18em; font-size: 12px; margin-bottom: 12px; }
+.title { font-size: clamp(64px, 14vw, 180px); line-height: .85; margin: 0; display: flex; gap: .1em; justify-content: center; font-weight: 900; background: linear-gradient(90deg, var(--primary), var(--accent)); -webkit-background-clip: text; background-clip: text; color: transparent; text-shadow: 0 10px 60px color-mix(in srgb, var(--accent), transparent 70%); }
+.tagline { color: var(--muted); font-size: clamp(14px, 2.2vw, 18px); max-width: 60ch; margin: 16px auto 24px; text-align: center; }
+.actions { display: flex; justify-content: center; gap: 12px; flex-wrap: wrap; }
+.btn { appearance: none; border: 0; padding: 12px 16px; border-radius: 14px; font-weight: 700; cursor: pointer; text-decoration: none; display: inline-flex; align-items: center; gap: 8px; }
+.btn.primary { background: linear-gradient(90deg, var(--primary), var(--accent)); color: #0b0d12; box-shadow: 0 10px 30px color-mix(in srgb, var(--accent), transparent 70%); }
+.btn.ghost { background: transparent; color: var(--text); border: 1px solid var(--card); }
+
+.extras { display: flex; justify-content: center; gap: 10px; flex-wrap: wrap; margin-top: 16px; }
+.chip { background: rgba(255,255,255,0.06); border: 1px solid var(--card); padding: 8px 12px; border-radius: 999px; color: var(--muted); font-weight: 600; }
+
+.controls { display: flex; justify-content: center; gap: 10px; margin-top: 18px; }
+.ctrl { background: rgba(255,255,255,0.06); color: var(--text); border: 1px solid var(--card); padding: 8px 12px; border-radius: 10px; cursor: pointer; }
+.ctrl:hover { border-color: var(--ring); }
+
+.site-footer { border-top: 1px solid var(--card); padding: 24px clamp(16px, 3vw, 40px); }
+.cols { display: grid; grid-template-columns: 2fr 1fr 1fr; gap: 20px; max-width: 1200px; margin: 0 auto; }
+.cols h3 { margin: 0 0 8px; }
+.cols ul { list-style: none; padding: 0; margin: 0; display: grid; gap: 8px; }
+.cols a { color: var(--muted); text-decoration: none; }
+.cols a:hover { color: var(--text); }
+
+.decor { position: absolute; inset: 0; pointer-events: none; z-index: 1; }
+body.variant-aurora .decor {
+  background: conic-gradient(from 180deg at 70% 20%, color-mix(in oklab, var(--accent), transparent 70%), transparent),
+              radial-gradient(600px 400px at 20% 80%, color-mix(in oklab, var(--primary), transparent 75%), transparent);
+  filter: blur(30px) saturate(120%);
+  opacity: .9;
+}
+body.variant-neon .title { text-shadow: 0 0 10px color-mix(in srgb, var(--accent), transparent 40%), 0 0 40px color-mix(in srgb, var(--accent), transparent 60%); }
+body.variant-memphis .decor::before { content: ""; position: absolute; inset: 0; background-image: radial-gradient(circle at 20% 30%, rgba(255,255,255,0.08) 2px, transparent 3px), radial-gradient(circle at 60% 70%, rgba(255,255,255,0.06) 2px, transparent 3px); background-size: 24px 24px; }
+body.variant-waves .decor { background: linear-gradient(transparent 60%, rgba(255,255,255,0.06) 60%),
+  url('data:image/svg+xml;utf8,{{waves_uri}}'); background-repeat: no-repeat; background-position: bottom; background-size: cover; }
+body.variant-retrogrid .decor { background-image: linear-gradient(rgba(255,255,255,0.06) 1px, transparent 1px), linear-gradient(90deg, rgba(255,255,255,0.06) 1px, transparent 1px); background-size: 40px 40px; mask-image: radial-gradient(circle at 60% 40%, #000 40%, transparent 70%); opacity: .6; }
+body.variant-split .content { display: grid; grid-template-columns: 1.1fr .9fr; align-items: center; gap: clamp(16px, 3vw, 40px); }
+body.variant-split .content::after { content: ""; display: block; height: 280px; border-radius: 20px; background: linear-gradient(180deg, color-mix(in oklab, var(--primary), transparent 40%), color-mix(in oklab, var(--accent), transparent 40%)); box-shadow: inset 0 0 0 1px var(--card), 0 20px 40px color-mix(in srgb, var(--accent), transparent 80%); }
+body.variant-cards .content { box-shadow: 0 20px 80px color-mix(in srgb, var(--accent), transparent 85%), inset 0 0 0 1px var(--card); }
+
+@media (max-width: 900px) {
+  .cols { grid-template-columns: 1fr; }
+  body.variant-split .content { grid-template-columns: 1fr; }
+}
+"""
+WAVES_SVG = """<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 1200 200" preserveAspectRatio="none">
+        <path d="M0,64 C300,160 900,0 1200,96 L1200,00 L0,0 Z" fill="rgba(255,255,255,0.05)"/>
+      </svg>"""
+
+
+@functools.lru_cache(maxsize=None)
+def css_template(minify: bool = False) -> Template:
+    # The waves data URI never changes, so it is quoted once per process.
+    return Template(CSS_SOURCE, waves_uri=quote(prepare_svg(WAVES_SVG, minify)))
+
+
+def css_text(theme_vars: str, font: str, content_bg: str, minify: bool = False) -> str:
+    return css_template(minify).render(theme_vars=theme_vars, font=font, content_bg=content_bg)
+
+
+# Static stand-ins for the decor that is expensive to paint: no blur filters, no
+# backdrop filters and no fixed background (which repaints on every scroll). The
+# aurora glow is approximated with soft-edged radial gradients.
+LOW_POWER_RULES = Template("""\
+{{scope}}body { background-attachment: scroll; }
+{{scope}}body.variant-glass .content, {{scope}}body.variant-soft .content {
+  backdrop-filter: none;
+  background: color-mix(in oklab, #141722, transparent 8%);
+}
+{{scope}}body.variant-aurora .decor {
+  filter: none;
+  background: radial-gradient(55% 60% at 70% 20%, color-mix(in oklab, var(--accent), transparent 72%), transparent 72%),
+              radial-gradient(700px 500px at 20% 80%, color-mix(in oklab, var(--primary), transparent 80%), transparent 75%);
+}
+""")
+
+
+def low_power_css() -> str:
+    # Applied for reduced-motion/transparency users, or with class="low-power" on <html>.
+    media = textwrap.indent(LOW_POWER_RULES.render(scope=""), "  ")
+    return (f"\n@media (prefers-reduced-motion: reduce), (prefers-reduced-transparency: reduce) {{\n{media}}}\n"
+            + LOW_POWER_RULES.render(scope=".low-power "))
+
+
+def make_js(service_worker: bool = False) -> str:
+    js = textwrap.dedent(
         """
         const counterEl = document.getElementById('counter');
         let seconds = 10;
@@ -399,29 +946,93 @@ def make_js() -> str:
         start();
         """
     )
+    if service_worker:
+        js += SW_REGISTER
+    return js
+
+
+SW_FILE = "sw.js"
+
+# Resolved against the page (or its <base>), so the worker sits next to index.html
+# and its scope is the template folder. A 404 served under some other URL still
+# installs it, but only visits to the folder URL are controlled by it.
+SW_REGISTER = f"""
+// Offline shell: {SW_FILE} precaches this page so repeat 404s skip the network.
+if ('serviceWorker' in navigator) navigator.serviceWorker.register('{SW_FILE}').catch(() => {{}});
+"""
+
+SERVICE_WORKER = Template(textwrap.dedent("""
+    // Generated service worker for {{folder}}: precaches the 404 shell and serves it cache-first.
+    const CACHE = '{{cache}}';
+    const PRECACHE = {{urls}};
+
+    self.addEventListener('install', (event) => {
+      event.waitUntil(caches.open(CACHE).then((cache) => Promise.all(PRECACHE.map(async (url) => {
+        // CDN stylesheets are stored as opaque responses, as the page itself requests them.
+        const response = await fetch(url, { mode: /^https?:/.test(url) ? 'no-cors' : 'same-origin' });
+        if (response.ok || response.type === 'opaque') await cache.put(url, response);
+      }))).then(() => self.skipWaiting()));
+    });
+
+    // Every build gets a new cache name; drop the ones left by earlier builds of this page.
+    self.addEventListener('activate', (event) => {
+      event.waitUntil(caches.keys().then((keys) => Promise.all(
+        keys.filter((key) => key.startsWith('{{prefix}}') && key !== CACHE).map((key) => caches.delete(key))
+      )).then(() => self.clients.claim()));
+    });
+
+    self.addEventListener('fetch', (event) => {
+      if (event.request.method !== 'GET') return;
+      event.respondWith(caches.open(CACHE).then(async (cache) => {
+        // Every navigation inside this folder is the 404 page itself.
+        const navigate = event.request.mode === 'navigate';
+        const hit = await cache.match(navigate ? 'index.html' : event.request, { ignoreSearch: true });
+        if (hit) return hit;
+        // Font files named by CDN stylesheets are only known at runtime.
+        const response = await fetch(event.request);
+        if (response.ok || response.type === 'opaque') cache.put(event.request, response.clone());
+        return response;
+      }));
+    });
+    """))
+
+
+def service_worker_js(folder: str, files: list) -> str:
+    # files are the template's final (name, text) pairs; the cache name is a hash of
+    # them, so any change to the page or its assets rolls the cache on next deploy.
+    page = _PageAuditor()
+    page.feed(dict(files)["index.html"])
+    page.close()
+    urls = ["./", "index.html"]
+    urls += page.stylesheets + page.scripts
+    urls += [m.group(2) for text in page.css for m in CSS_URL_RE.finditer(text)]
+    urls = list(dict.fromkeys(url for url in urls if not url.startswith(("data:", "#"))))
+    build = hashlib.sha256()
+    for name, data in sorted(files):
+        build.update(f"{name}\0{data}\0".encode("utf-8"))
+    return SERVICE_WORKER.render(folder=folder, cache=f"{folder}:{build.hexdigest()[:12]}", prefix=f"{folder}:",
+                                 urls=json.dumps(urls))
 
 
-def connector_html(entries):
-    cards = []
-    for i, (folder, brand, slug) in enumerate(entries):
-        primary, accent = palettes[i % len(palettes)]
-        cards.append(f"""
+def connector_card(folder: str, brand: str, slug: str, primary: str, accent: str) -> str:
+    return f"""
         <a class=\"card\" href=\"{folder}/index.html\">
           <div class=\"card-bg\" style=\"--p:{primary};--a:{accent}\"></div>
           <div class=\"card-body\">
-            <div class=\"card-title\">{brand}</div>
-            <div class=\"card-sub\">{slug.replace('-', ' ').title()}</div>
+            <div class=\"card-title\">{escape(brand)}</div>
+            <div class=\"card-sub\">{escape(slug.replace('-', ' ').title())}</div>
           </div>
         </a>
-        """)
+        """
+
 
-    head = textwrap.dedent("""
+CONNECTOR_HEAD = Template(textwrap.dedent("""
     <!doctype html>
     <html lang="en">
     <head>
       <meta charset="utf-8"/>
       <meta name="viewport" content="width=device-width, initial-scale=1"/>
-      <title>404 Template Gallery (60)</title>
+      <title>404 Template Gallery ({{count}})</title>
       <link rel="preconnect" href="https://fonts.googleapis.com"/>
       <link rel="preconnect" href="https://fonts.gstatic.com" crossorigin/>
       <link href="https://fonts.googleapis.com/css2?family=Outfit:wght@400;700;900&display=swap" rel="stylesheet"/>
@@ -442,22 +1053,205 @@ def connector_html(entries):
     </head>
     <body>
       <header>
-        <h1>404 Template Gallery (60)</h1>
+        <h1>404 Template Gallery ({{count}})</h1>
         <nav>
           <a href="tutorial.html" style="color:var(--text);text-decoration:none;border:1px solid var(--card);padding:8px 12px;border-radius:10px">Customization Tutorial</a>
         </nav>
       </header>
       <main class="grid">
-    """)
+    """))
 
-    tail = textwrap.dedent("""
-      </main>
-      <footer>Open any card to view the template.</footer>
-    </body>
-    </html>
-    """)
+CONNECTOR_TAIL = textwrap.dedent("""
+  </main>
+  <footer>Open any card to view the template.</footer>
+</body>
+</html>
+""")
+
+
+class Gallery:
+    # Connector cards are spooled to a temporary file as templates stream past, so
+    # the gallery of a large catalog never has to sit in memory.
+    def __init__(self, minify: bool = False):
+        self.count = 0
+        self.minify = minify
+        self._cards = tempfile.SpooledTemporaryFile(max_size=1 << 20, mode="w+", encoding="utf-8")
+
+    def card(self, folder: str, brand: str, slug: str, primary: str, accent: str, first: bool) -> str:
+        card = connector_card(folder, brand, slug, primary, accent)
+        if self.minify:
+            # Whitespace between the inline <a> cards collapses to one space.
+            card = ("" if first else " ") + minify_html(card).strip()
+        return card
+
+    def add(self, folder: str, brand: str, slug: str, theme: Theme):
+        self._cards.write(self.card(folder, brand, slug, theme.primary, theme.accent, not self.count))
+        self.count += 1
+
+    def chunks(self):
+        head = CONNECTOR_HEAD.render(count=str(self.count))
+        yield minify_html(head).rstrip("\n") if self.minify else head
+        self._cards.seek(0)
+        while chunk := self._cards.read(1 << 16):
+            yield chunk
+        yield minify_html(CONNECTOR_TAIL) if self.minify else CONNECTOR_TAIL
+
+    def files(self):
+        # (relative path, chunks) for every file the gallery produces.
+        yield "index.html", self.chunks()
+
+    def close(self):
+        self._cards.close()
+
+
+GALLERY_DIR = "gallery"
+GALLERY_PAGE_SIZE = 60
+GALLERY_FIELDS = ("folder", "brand", "slug", "variant", "primary", "accent")
+
+GALLERY_PAGED_HEAD = Template(textwrap.dedent("""
+    <!doctype html>
+    <html lang="en">
+    <head>
+      <meta charset="utf-8"/>
+      <meta name="viewport" content="width=device-width, initial-scale=1"/>
+      <title>404 Template Gallery ({{count}})</title>
+      <link rel="preconnect" href="https://fonts.googleapis.com"/>
+      <link rel="preconnect" href="https://fonts.gstatic.com" crossorigin/>
+      <link href="https://fonts.googleapis.com/css2?family=Outfit:wght@400;700;900&display=swap" rel="stylesheet"/>
+      <style>
+        :root{--bg:#0b0d12;--card:rgba(255,255,255,.06);--text:#e6e7eb;--muted:#a2a6b3}
+        *{box-sizing:border-box}
+        body{margin:0;background:radial-gradient(1200px 800px at 85% -10%, #1a1e2d, transparent 60%),radial-gradient(900px 700px at -10% 120%, #151824, transparent 60%),#0b0d12;color:var(--text);font-family:Outfit,system-ui,-apple-system,Segoe UI,Roboto,Ubuntu,Cantarell,Noto Sans,Helvetica Neue,Arial}
+        header{display:flex;flex-wrap:wrap;gap:12px;align-items:center;justify-content:space-between;padding:20px clamp(16px,3vw,40px)}
+        h1{font-size:clamp(24px,3vw,34px);margin:0}
+        input[type=search]{font:inherit;color:var(--text);background:var(--card);border:1px solid var(--card);border-radius:10px;padding:8px 12px;min-width:min(320px,100%)}
+        .grid{display:grid;grid-template-columns:repeat(auto-fit,minmax(240px,1fr));gap:16px;padding:20px clamp(16px,3vw,40px) 48px;max-width:1400px;margin:0 auto}
+        .card{position:relative;display:block;border-radius:18px;overflow:hidden;text-decoration:none;color:var(--text);border:1px solid var(--card);content-visibility:auto;contain-intrinsic-size:auto 76px}
+        .card-bg{position:absolute;inset:0;background:radial-gradient(120% 140% at 0 0,var(--p),transparent 70%),radial-gradient(120% 140% at 100% 100%,var(--a),transparent 70%);opacity:.3}
+        .card-body{position:relative;z-index:2;padding:18px}
+        .card-title{font-weight:800}
+        .card-sub{color:var(--muted);font-size:12px;margin-top:2px}
+        #more{height:1px}
+        footer{padding:24px;color:var(--muted);text-align:center}
+      </style>
+    </head>
+    <body>
+      <header>
+        <h1>404 Template Gallery ({{count}})</h1>
+        <input type="search" id="q" placeholder="Search brand, slug or variant" aria-label="Search templates"/>
+        <nav>
+          <a href="tutorial.html" style="color:var(--text);text-decoration:none;border:1px solid var(--card);padding:8px 12px;border-radius:10px">Customization Tutorial</a>
+        </nav>
+      </header>
+      <main class="grid" id="results" hidden></main>
+      <main class="grid" id="grid" data-pages="{{pages}}">
+    """))
+
+GALLERY_PAGED_TAIL = textwrap.dedent("""
+  </main>
+  <div id="more"></div>
+  <footer>Open any card to view the template.</footer>
+  <script>
+    (() => {
+      const grid = document.getElementById('grid');
+      const results = document.getElementById('results');
+      const more = document.getElementById('more');
+      const pages = Number(grid.dataset.pages);
+      const cache = new Map();
+      let next = 2, searchIndex = null, query = 0;
+
+      const page = (n) => {
+        if (!cache.has(n)) cache.set(n, fetch(`gallery/page-${String(n).padStart(4, '0')}.json`).then((r) => r.json()));
+        return cache.get(n);
+      };
+      const title = (slug) => slug.replace(/-/g, ' ').replace(/[a-z]+/gi, (w) => w[0].toUpperCase() + w.slice(1).toLowerCase());
+      const card = ([folder, brand, slug, variant, primary, accent]) => {
+        const a = document.createElement('a');
+        a.className = 'card';
+        a.href = `${folder}/index.html`;
+        a.innerHTML = '<div class="card-bg"></div><div class="card-body"><div class="card-title"></div><div class="card-sub"></div></div>';
+        a.firstChild.style.cssText = `--p:${primary};--a:${accent}`;
+        a.querySelector('.card-title').textContent = brand;
+        a.querySelector('.card-sub').textContent = title(slug);
+        return a;
+      };
+
+      // Later pages are fetched as the end of the grid scrolls into view.
+      const observer = new IntersectionObserver(async (entries) => {
+        if (!entries[0].isIntersecting || next > pages) return;
+        const n = next++;
+        grid.append(...(await page(n)).map(card));
+        observer.unobserve(more);
+        observer.observe(more);
+      }, { rootMargin: '800px' });
+      if (pages > 1) observer.observe(more);
+
+      // Prefix search over the prebuilt token index; ids map straight to pages.
+      document.getElementById('q').addEventListener('input', async (e) => {
+        const terms = e.target.value.toLowerCase().match(/[a-z0-9]+/g);
+        const id = ++query;
+        grid.hidden = !!terms;
+        results.hidden = !terms;
+        if (!terms) return;
+        searchIndex ||= await fetch('gallery/search.json').then((r) => r.json());
+        let hits = null;
+        for (const term of terms) {
+          const ids = new Set();
+          for (const [token, list] of Object.entries(searchIndex.tokens)) {
+            if (token.startsWith(term)) list.forEach((i) => ids.add(i));
+          }
+          hits = hits ? new Set([...hits].filter((i) => ids.has(i))) : ids;
+        }
+        const shown = [...hits].sort((a, b) => a - b).slice(0, 120);
+        const size = searchIndex.pageSize;
+        const records = await Promise.all(shown.map(async (i) => (await page(Math.floor(i / size) + 1))[i % size]));
+        if (id === query) results.replaceChildren(...records.map(card));
+      });
+    })();
+  </script>
+</body>
+</html>
+""")
+
+
+class PagedGallery(Gallery):
+    # Only the first page of cards is rendered into index.html; the rest are JSON
+    # pages fetched on scroll, next to a prebuilt token index for search.
+    def __init__(self, minify: bool = False, page_size: int = GALLERY_PAGE_SIZE):
+        super().__init__(minify)
+        self.page_size = page_size
+        self.tokens = {}
+
+    def add(self, folder: str, brand: str, slug: str, theme: Theme):
+        record = [folder, brand, slug, theme.variant, theme.primary, theme.accent]
+        self._cards.write(json.dumps(record, separators=(",", ":")) + "\n")
+        for token in set(re.findall(r"[a-z0-9]+", f"{brand} {slug} {theme.variant}".lower())):
+            self.tokens.setdefault(token, []).append(self.count)
+        self.count += 1
+
+    def records(self):
+        self._cards.seek(0)
+        for line in self._cards:
+            yield json.loads(line)
 
-    return head + "".join(cards) + tail
+    def chunks(self):
+        pages = -(-self.count // self.page_size)
+        head = GALLERY_PAGED_HEAD.render(count=str(self.count), pages=str(pages))
+        yield minify_html(head).rstrip("\n") if self.minify else head
+        for n, (folder, brand, slug, _, primary, accent) in zip(range(self.page_size), self.records()):
+            yield self.card(folder, brand, slug, primary, accent, not n)
+        yield minify_html(GALLERY_PAGED_TAIL) if self.minify else GALLERY_PAGED_TAIL
+
+    def files(self):
+        yield "index.html", self.chunks()
+        for n, page in enumerate(_batched(self.records(), self.page_size), 1):
+            yield f"{GALLERY_DIR}/page-{n:04d}.json", [json.dumps(page, ensure_ascii=False, separators=(",", ":"))]
+        index = {"count": self.count, "pageSize": self.page_size, "fields": GALLERY_FIELDS,
+                 "tokens": dict(sorted(self.tokens.items()))}
+        yield f"{GALLERY_DIR}/search.json", [json.dumps(index, ensure_ascii=False, separators=(",", ":"))]
+
+
+GALLERIES = {"single": Gallery, "paged": PagedGallery}
 
 
 def tutorial_html() -> str:
@@ -549,34 +1343,2520 @@ def tutorial_html() -> str:
     )
 
 
-def main():
-    entries = []
-    for i, (slug, brand, tagline, letter) in enumerate(niches):
-        folder = f"404-{i+1:02d}-{slug}"
-        out_path = os.path.join(OUT_DIR, folder)
-        ensure_dir(out_path)
+# --- Offline vendoring -------------------------------------------------------
+# Expected --vendor-dir layout (mirrors the npm packages the CDN links point at):
+#   fonts/<family>-<weight>.woff2          e.g. fonts/plus-jakarta-sans-800.woff2
+#   boxicons/css/boxicons.min.css          plus the fonts it references
+#   remixicon/fonts/remixicon.css          plus the fonts it references
+#   boxicons/svg/{regular,solid,logos}/    per-icon SVGs, only for --inline-icons
+#   remixicon/icons/<category>/            per-icon SVGs, only for --inline-icons
 
-        with open(os.path.join(out_path, "index.html"), "w", encoding="utf-8") as f:
-            f.write(make_html(i, slug, brand, tagline, letter))
+ICON_SHEETS = ("boxicons/css/boxicons.min.css", "remixicon/fonts/remixicon.css")
+ICON_CLASS_RE = re.compile(r"\b(?:bx|bxs|bxl|ri)-[a-z0-9-]+")
+ICON_TAG_RE = re.compile(r'<i class="((?:bx|bxs|bxl) [^"]+|ri-[^"]+)"></i>')
+ICON_SVG_DIRS = {"bx": "boxicons/svg/regular", "bxs": "boxicons/svg/solid", "bxl": "boxicons/svg/logos"}
+FONT_FORMATS = {"woff2": "woff2", "woff": "woff", "truetype": "ttf", "opentype": "otf"}
+FONT_EXTS = {ext: fmt for fmt, ext in FONT_FORMATS.items()}
 
-        with open(os.path.join(out_path, "style.css"), "w", encoding="utf-8") as f:
-            f.write(make_css(i))
 
-        with open(os.path.join(out_path, "script.js"), "w", encoding="utf-8") as f:
-            f.write(make_js())
+def strip_css_comments(css: str) -> str:
+    return re.sub(r"/\*.*?\*/", "", css, flags=re.S)
 
-        entries.append((folder, brand, slug))
 
-    # Connector
-    with open(os.path.join(OUT_DIR, "index.html"), "w", encoding="utf-8") as f:
-        f.write(connector_html(entries))
+def split_css_rules(css: str) -> list:
+    # Top-level (prelude, body) pairs; body is None for statements like @import.
+    # Nested blocks (@media, @supports) keep their raw body and can be split again.
+    rules = []
+    depth = 0
+    quote_char = None
+    start = brace = 0
+    for i, ch in enumerate(css):
+        if quote_char:
+            if ch == quote_char and css[i - 1] != "\\":
+                quote_char = None
+        elif ch in "\"'":
+            quote_char = ch
+        elif ch == "{":
+            if depth == 0:
+                brace = i
+            depth += 1
+        elif ch == "}":
+            depth -= 1
+            if depth == 0:
+                rules.append((css[start:brace].strip(), css[brace + 1:i].strip()))
+                start = i + 1
+        elif ch == ";" and depth == 0:
+            rules.append((css[start:i].strip(), None))
+            start = i + 1
+    return rules
 
-    with open(os.path.join(OUT_DIR, "tutorial.html"), "w", encoding="utf-8") as f:
-        f.write(tutorial_html())
 
-    print(f"Generated {len(entries)} templates, connector index.html and tutorial.html")
+def join_css_rules(rules: list) -> str:
+    return "".join(f"{prelude};" if body is None else f"{prelude}{{{body}}}" for prelude, body in rules)
 
 
-if __name__ == "__main__":
-    main()
+# Classes a page can gain after load: set by script or by the embedding site.
+RUNTIME_CLASSES = frozenset({"low-power"})
+CSS_GROUP_AT_RULES = ("@media", "@supports", "@container", "@layer")
+_SELECTOR_GROUP_RE = re.compile(r"\([^()]*\)|\[[^\[\]]*\]")
+
+
+class _SelectorCollector(HTMLParser):
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.classes = set()
+        self.ids = set()
+
+    def handle_starttag(self, tag, attrs):
+        for name, value in attrs:
+            if name == "class" and value:
+                self.classes.update(value.split())
+            elif name == "id" and value:
+                self.ids.add(value)
+
+
+def split_selectors(prelude: str) -> list:
+    parts, depth, start = [], 0, 0
+    for i, ch in enumerate(prelude):
+        if ch in "([":
+            depth += 1
+        elif ch in ")]":
+            depth -= 1
+        elif ch == "," and depth == 0:
+            parts.append(prelude[start:i].strip())
+            start = i + 1
+    parts.append(prelude[start:].strip())
+    return parts
+
+
+def selector_can_match(selector: str, classes, ids) -> bool:
+    # Conservative: only classes and ids outside (...) and [...] are required, so
+    # :not(.x), :is(...) and attribute selectors never cause a rule to be dropped.
+    while True:
+        stripped = _SELECTOR_GROUP_RE.sub("", selector)
+        if stripped == selector:
+            break
+        selector = stripped
+    return (all(c in classes for c in re.findall(r"\.(-?[_a-zA-Z][\w-]*)", selector))
+            and all(i in ids for i in re.findall(r"#(-?[_a-zA-Z][\w-]*)", selector)))
+
+
+def _prune_rules(rules: list, classes, ids) -> tuple:
+    kept, removed = [], 0
+    for prelude, body in rules:
+        if body is None or (prelude.startswith("@") and not prelude.startswith(CSS_GROUP_AT_RULES)):
+            kept.append((prelude, body))
+        elif prelude.startswith("@"):
+            inner, count = _prune_rules(split_css_rules(body), classes, ids)
+            removed += count
+            if inner:
+                kept.append((prelude, format_css_rules(inner)))
+        else:
+            live = [s for s in split_selectors(prelude) if selector_can_match(s, classes, ids)]
+            if live:
+                kept.append((", ".join(live), body))
+            else:
+                removed += 1
+    return kept, removed
+
+
+def format_css_rules(rules: list) -> str:
+    # Readable counterpart of join_css_rules; minification happens later if asked.
+    lines = []
+    for prelude, body in rules:
+        if body is None:
+            lines.append(f"{prelude};")
+        elif prelude.startswith(CSS_GROUP_AT_RULES):
+            lines.append(f"{prelude} {{\n{textwrap.indent(body, '  ')}\n}}")
+        elif "\n" in body:
+            lines.append(f"{prelude} {{\n  {body}\n}}")
+        else:
+            lines.append(f"{prelude} {{ {body} }}")
+    return "\n".join(lines)
+
+
+def prune_css(css: str, html: str, js: str = "") -> tuple:
+    # Drops rules whose selectors need a class or id that the page never has (for
+    # example every other variant's rules) and group rules left empty.
+    # Returns (css, rules removed).
+    collector = _SelectorCollector()
+    collector.feed(html)
+    # Anything that looks like an identifier in the script may be added at runtime.
+    classes = collector.classes | RUNTIME_CLASSES | set(re.findall(r"[A-Za-z_][\w-]*", js))
+    ids = collector.ids | set(re.findall(r"[A-Za-z_][\w-]*", js))
+    rules, removed = _prune_rules(split_css_rules(strip_css_comments(css)), classes, ids)
+    return format_css_rules(rules) + "\n", removed
+
+
+def used_icon_classes(*sources: str) -> frozenset:
+    return frozenset(ICON_CLASS_RE.findall("\n".join(sources)))
+
+
+class _TextCollector(HTMLParser):
+    def __init__(self):
+        super().__init__()
+        self.skip = 0
+        self.chars = set()
+
+    def handle_starttag(self, tag, attrs):
+        self.skip += tag in ("script", "style")
+
+    def handle_endtag(self, tag):
+        self.skip -= tag in ("script", "style")
+
+    def handle_data(self, data):
+        if not self.skip:
+            self.chars.update(data)
+
+
+def page_text_chars(html: str) -> frozenset:
+    parser = _TextCollector()
+    parser.feed(html)
+    # The countdown rewrites the counter at runtime, so digits are always needed.
+    return frozenset(c for c in parser.chars | set("0123456789") if not c.isspace()) | {" "}
+
+
+@functools.lru_cache(maxsize=64)
+def read_vendor_file(path: str) -> bytes:
+    with open(path, "rb") as f:
+        return f.read()
+
+
+@functools.lru_cache(maxsize=None)
+def vendor_fingerprint(vendor_dir: str) -> str:
+    h = hashlib.sha256()
+    for root, _, names in sorted(os.walk(vendor_dir)):
+        for name in sorted(names):
+            st = os.stat(os.path.join(root, name))
+            h.update(f"{os.path.relpath(os.path.join(root, name), vendor_dir)}:{st.st_size}:{st.st_mtime_ns}\n".encode())
+    return h.hexdigest()
+
+
+@functools.lru_cache(maxsize=4096)
+def subset_font(path: str, codepoints: frozenset) -> tuple:
+    # Returns (bytes, extension). Without fontTools the font is copied as-is.
+    data = read_vendor_file(path)
+    if ft_subset is None:
+        return data, os.path.splitext(path)[1].lstrip(".")
+    options = ft_subset.Options()
+    options.flavor = "woff2" if brotli is not None else "woff"
+    font = TTFont(BytesIO(data))
+    subsetter = ft_subset.Subsetter(options)
+    subsetter.populate(unicodes=sorted(codepoints))
+    subsetter.subset(font)
+    buf = BytesIO()
+    ft_subset.save_font(font, buf, options)
+    return buf.getvalue(), options.flavor
+
+
+def vendored_font(path: str, codepoints: frozenset, shared: dict) -> str:
+    data, ext = subset_font(path, codepoints)
+    stem = os.path.splitext(os.path.basename(path))[0]
+    rel = f"{VENDOR_OUT}/{hashed_name(stem, ext, data)}"
+    shared[rel] = data
+    return f"url(../{rel}) format('{FONT_EXTS.get(ext, ext)}')"
+
+
+def pick_font_src(src: str, base_dir: str):
+    candidates = {}
+    for url, fmt in re.findall(r"url\(\s*['\"]?([^'\")]+)['\"]?\s*\)\s*format\(\s*['\"]?([\w-]+)", src):
+        candidates.setdefault(fmt, os.path.normpath(os.path.join(base_dir, url.split("?")[0].split("#")[0])))
+    for fmt in FONT_FORMATS:
+        if fmt in candidates and os.path.exists(candidates[fmt]):
+            return candidates[fmt]
+    return None
+
+
+def subset_icon_rules(rules: list, used: frozenset) -> list:
+    kept = []
+    for prelude, body in rules:
+        if body is None or prelude.startswith("@font-face"):
+            kept.append((prelude, body))
+        elif prelude.startswith("@media") or prelude.startswith("@supports"):
+            inner = subset_icon_rules(split_css_rules(body), used)
+            if inner:
+                kept.append((prelude, join_css_rules(inner)))
+        elif not prelude.startswith("@"):
+            selectors = [sel for sel in prelude.split(",") if all(c in used for c in ICON_CLASS_RE.findall(sel))]
+            if selectors:
+                kept.append((",".join(sel.strip() for sel in selectors), body))
+        else:
+            kept.append((prelude, body))
+    # Keyframes only survive if a kept rule still animates with them.
+    bodies = "".join(body for prelude, body in kept if body and not prelude.startswith("@keyframes"))
+    return [(p, b) for p, b in kept if not (p.startswith("@keyframes") and p.split()[-1] not in bodies)]
+
+
+@functools.lru_cache(maxsize=None)
+def vendored_icon_css(vendor_dir: str, used: frozenset) -> tuple:
+    # Returns (css, shared files) for the subset of both icon sheets.
+    shared = {}
+    out = []
+    for rel in ICON_SHEETS:
+        path = os.path.join(vendor_dir, rel)
+        rules = subset_icon_rules(split_css_rules(strip_css_comments(read_vendor_file(path).decode("utf-8"))), used)
+        codepoints = frozenset(
+            int(cp, 16) for body in (b for _, b in rules if b) for cp in re.findall(r"content\s*:\s*['\"]\\([0-9a-fA-F]+)", body)
+        )
+        for prelude, body in rules:
+            if prelude.startswith("@font-face"):
+                decls = [d.strip() for d in body.split(";") if d.strip()]
+                font_path = pick_font_src(" ".join(d for d in decls if d.startswith("src")), os.path.dirname(path))
+                if font_path is None:
+                    continue
+                decls = [d for d in decls if not d.startswith("src")]
+                decls.append(f"src:{vendored_font(font_path, codepoints, shared)}")
+                body = ";".join(decls)
+            out.append((prelude, body))
+    return join_css_rules(out), tuple(shared.items())
+
+
+def font_spec_faces(font_spec: str) -> tuple:
+    # "Inter:wght@400;700" -> ("Inter", ["400", "700"])
+    family = font_spec.split(':')[0].replace('+', ' ')
+    return family, font_spec.split('@', 1)[1].split(';') if '@' in font_spec else ["400"]
+
+
+def vendored_font_path(vendor_dir: str, family: str, weight: str) -> tuple:
+    # Returns (stem, path); path is None when no format of the face is vendored.
+    stem = os.path.join(vendor_dir, "fonts", f"{family.lower().replace(' ', '-')}-{weight}")
+    return stem, next((f"{stem}.{ext}" for ext in FONT_EXTS if os.path.exists(f"{stem}.{ext}")), None)
+
+
+def missing_vendor_files(vendor_dir: str, brands, icons: bool = True) -> list:
+    # Everything a build will read from vendor_dir, checked before anything is
+    # written; icons=False is the --inline-icons build, which needs SVGs instead.
+    missing = []
+    if icons:
+        missing.extend(os.path.join(vendor_dir, rel) for rel in ICON_SHEETS
+                       if not os.path.exists(os.path.join(vendor_dir, rel)))
+    else:
+        for icon in sorted(used_icon_classes(PAGE_SOURCE, SCRIPT_CONTROLS, STATIC_CONTROLS, make_js())):
+            try:
+                icon_svg_path(vendor_dir, icon)
+            except FileNotFoundError:
+                missing.append(f"{icon}.svg")
+    fonts = {theme_for(i, brand).font for i, brand in enumerate(brands)}
+    for spec in sorted(fonts):
+        family, weights = font_spec_faces(spec)
+        for weight in weights:
+            stem, path = vendored_font_path(vendor_dir, family, weight)
+            if path is None:
+                missing.append(f"{stem}.woff2")
+    return missing
+
+
+def text_font_faces(vendor_dir: str, font_spec: str, chars: frozenset, shared: dict) -> str:
+    family, weights = font_spec_faces(font_spec)
+    codepoints = frozenset(ord(c) for c in chars)
+    faces = []
+    for weight in weights:
+        stem, path = vendored_font_path(vendor_dir, family, weight)
+        if path is None:
+            raise FileNotFoundError(f"vendored font not found: {stem}.woff2")
+        faces.append(f"@font-face{{font-family:'{family}';font-style:normal;font-weight:{weight};"
+                     f"font-display:swap;src:{vendored_font(path, codepoints, shared)}}}")
+    return "".join(faces)
+
+
+def vendor_page(vendor_dir: str, theme: Theme, html: str, js: str, icons: bool = True) -> tuple:
+    # Inline CSS replacing the Google Fonts and icon CDN links, plus the files it needs.
+    # icons=False leaves the icon fonts out, for pages whose icons are inline SVG.
+    shared = {}
+    faces = text_font_faces(vendor_dir, theme.font, page_text_chars(html), shared)
+    icon_css, icon_files = vendored_icon_css(vendor_dir, used_icon_classes(html, js)) if icons else ("", ())
+    shared.update(icon_files)
+    return faces + icon_css, sorted(shared.items())
+
+
+def inline_vendored_urls(css: str, shared: list) -> str:
+    # url(../vendor/...) -> data: URI, for single-file pages that carry their fonts.
+    files = dict(shared)
+
+    def data_uri(m):
+        rel = m.group(1)
+        mime = CONTENT_TYPES.get(os.path.splitext(rel)[1], "application/octet-stream")
+        return f"url(data:{mime};base64,{base64.b64encode(files[rel]).decode('ascii')})"
+
+    return re.sub(rf"url\(\.\./({VENDOR_OUT}/[^)]+)\)", data_uri, css)
+
+
+@functools.lru_cache(maxsize=None)
+def remixicon_svgs(vendor_dir: str) -> dict:
+    # Remix Icon files live in category folders; index them by icon name once.
+    index = {}
+    for root, _, names in os.walk(os.path.join(vendor_dir, "remixicon", "icons")):
+        for name in names:
+            if name.endswith(".svg"):
+                index[name[:-4]] = os.path.join(root, name)
+    return index
+
+
+def icon_svg_path(vendor_dir: str, icon: str) -> str:
+    prefix, name = icon.split("-", 1)
+    if prefix == "ri":
+        path = remixicon_svgs(vendor_dir).get(name)
+    else:
+        path = os.path.join(vendor_dir, ICON_SVG_DIRS[prefix], f"{icon}.svg")
+    if path is None or not os.path.exists(path):
+        raise FileNotFoundError(f"vendored icon not found: {icon}.svg")
+    return path
+
+
+@functools.lru_cache(maxsize=1024)
+def icon_svg(path: str, classes: str) -> str:
+    # Sized and coloured like the icon font glyph it replaces; single quotes are
+    # avoided so the markup can also sit inside the page script's string literals.
+    source = read_vendor_file(path).decode("utf-8")
+    view_box = re.search(r'viewBox="([^"]+)"', source)
+    body = re.search(r"<svg\b[^>]*>(.*)</svg>", source, re.S)
+    inner = minify_svg(body.group(1)).replace("'", '"') if body else ""
+    return (f'<svg class="{classes}" viewBox="{view_box.group(1) if view_box else "0 0 24 24"}" width="1em" '
+            f'height="1em" fill="currentColor" aria-hidden="true" style="vertical-align:-.125em">{inner}</svg>')
+
+
+def inline_icon_svgs(text: str, vendor_dir: str) -> str:
+    # <i class="bx bx-moon"></i>, in markup or script strings, becomes that icon's SVG.
+    def replace(m):
+        icon = ICON_CLASS_RE.search(m.group(1)).group(0)
+        return icon_svg(icon_svg_path(vendor_dir, icon), m.group(1))
+
+    return ICON_TAG_RE.sub(replace, text)
+
+
+@dataclass(frozen=True)
+class BuildOptions:
+    shared_assets: bool = False
+    vendor_dir: str = None
+    minify: bool = False
+    no_js: bool = False
+    redirect: str = "/"
+    low_power: bool = False
+    prune_css: bool = False
+    service_worker: bool = False
+    base_href: str = None
+    inline: bool = False
+    inline_icons: bool = False
+
+
+DEFAULT_OPTIONS = BuildOptions()
+
+
+def template_folder(idx: int, slug: str) -> str:
+    return f"404-{idx+1:02d}-{slug}"
 
+
+def hashed_name(stem: str, ext: str, data: str) -> str:
+    return f"{stem}.{sha256_data(data)[:8]}.{ext}"
+
+
+class RenderedTemplate(NamedTuple):
+    folder: str
+    files: list
+    # Files shared between templates (vendored fonts); the caller writes each once.
+    shared: tuple = ()
+    # Per-template numbers for the build reports, e.g. {"raw": ..., "minified": ...}
+    # or {"pruned_rules": ..., "pruned_bytes": ...}; None when there is nothing to report.
+    report: dict = None
+
+
+@functools.lru_cache(maxsize=None)
+def shared_assets(minify: bool = False, low_power: bool = False, service_worker: bool = False) -> tuple:
+    # (relative path, text) for the content-addressed files shared by every template.
+    css = make_base_css(minify, low_power)
+    js = make_js(service_worker)
+    if minify:
+        css, js = minify_output(".css", css), minify_output(".js", js)
+    return (
+        (f"{ASSETS_DIR}/{hashed_name('base', 'css', css)}", css),
+        (f"{ASSETS_DIR}/{hashed_name('base', 'js', js)}", js),
+    )
+
+
+def _render_files(idx: int, niche, options: BuildOptions, minify: bool) -> tuple:
+    slug, brand, tagline, letter = niche[:4]
+    theme = theme_for(idx, niche)
+    links = {}
+    if options.shared_assets:
+        (css_path, _), (js_path, _) = shared_assets(minify, options.low_power, options.service_worker)
+        links = dict(stylesheets=(f"../{css_path}", "theme.css"), script=f"../{js_path}")
+    if options.no_js:
+        links.update(script=None, redirect=options.redirect)
+    if options.base_href:
+        links.update(base_href=f"{options.base_href}{template_folder(idx, slug)}/")
+    js = "" if options.no_js else make_js(options.service_worker)
+    with span("html"):
+        html = make_html(idx, slug, brand, tagline, letter, minify=minify, theme=theme, **links)
+    shared = []
+    vendored_css = None
+    if options.vendor_dir:
+        with span("vendor"):
+            vendored_css, shared = vendor_page(options.vendor_dir, theme, html, js, icons=not options.inline_icons)
+            if options.inline:
+                vendored_css, shared = inline_vendored_urls(vendored_css, shared), []
+            html = make_html(idx, slug, brand, tagline, letter, vendored_css=vendored_css, minify=minify,
+                             theme=theme, **links)
+    report = {}
+    with span("css"):
+        if options.shared_assets:
+            files = [("index.html", html), ("theme.css", make_theme_css(idx, theme))]
+        else:
+            css = make_css(idx, minify, theme=theme, low_power=options.low_power)
+            files = [("index.html", html), ("style.css", css)]
+    if options.prune_css and not options.shared_assets:
+        with span("prune"):
+            pruned_css, removed = prune_css(css, html, js)
+            report.update(pruned_rules=removed,
+                          pruned_bytes=len(css.encode("utf-8")) - len(pruned_css.encode("utf-8")))
+            css = pruned_css
+            files[1] = ("style.css", css)
+    if options.inline:
+        with span("inline"):
+            if options.inline_icons:
+                js = inline_icon_svgs(js, options.vendor_dir)
+            html = make_html(idx, slug, brand, tagline, letter, vendored_css=vendored_css, minify=minify,
+                             theme=theme, css=css, js=js, **links)
+            if options.inline_icons:
+                html = inline_icon_svgs(html, options.vendor_dir)
+            files = [("index.html", html)]
+    elif not options.shared_assets and not options.no_js:
+        with span("js"):
+            files.append(("script.js", js))
+    if minify:
+        # Raw size is measured here rather than with a second, unminified render.
+        report["raw"] = sum(len(data.encode("utf-8")) for _, data in files)
+        with span("minify"):
+            files = [(name, minify_output(name, data)) for name, data in files]
+        report["minified"] = sum(len(data.encode("utf-8")) for _, data in files)
+    if options.service_worker:
+        with span("sw"):
+            sw = service_worker_js(template_folder(idx, slug), files)
+            files.append((SW_FILE, minify_output(SW_FILE, sw) if minify else sw))
+    return files, shared, report
+
+
+def render_template(idx: int, niche, options: BuildOptions = DEFAULT_OPTIONS) -> RenderedTemplate:
+    # Pure rendering step: returns the folder name and its (filename, text) pairs
+    # so it can run in a worker process and be written out elsewhere.
+    folder = template_folder(idx, niche[0])
+    with span("render", "template", folder=folder):
+        files, shared, report = _render_files(idx, niche, options, minify=options.minify)
+        if options.inline:
+            document = files[0][1].encode("utf-8")
+            report.update(document=len(document), document_gz=len(gzip.compress(document, 9, mtime=0)))
+    return RenderedTemplate(folder, files, shared, report)
+
+
+def _render_task(task) -> tuple:
+    return render_template(*task)
+
+
+def _render_batch(tasks) -> list:
+    return [render_template(*task) for task in tasks]
+
+
+RENDER_BATCH = 16
+
+
+def render_templates(tasks, jobs: int = 1):
+    # Results come back in task order. Tasks may be a lazy iterable: only a
+    # bounded window of batches is in flight, so memory does not grow with it.
+    if jobs <= 1:
+        for task in tasks:
+            yield _render_task(task)
+        return
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        window = deque()
+        for batch in _batched(tasks, RENDER_BATCH):
+            window.append(pool.submit(_render_batch, batch))
+            if len(window) >= jobs * 4:
+                yield from window.popleft().result()
+        while window:
+            yield from window.popleft().result()
+
+
+def sha256_data(data) -> str:
+    return hashlib.sha256(data if isinstance(data, bytes) else data.encode("utf-8")).hexdigest()
+
+
+def file_digest(path: str):
+    try:
+        with open(path, "rb") as f:
+            return hashlib.sha256(f.read()).hexdigest()
+    except FileNotFoundError:
+        return None
+
+
+def input_hash(idx: int, niche, options: BuildOptions = DEFAULT_OPTIONS) -> str:
+    key = [
+        asdict(options),
+        list(niche[:4]),
+        list(theme_for(idx, niche)),
+        GENERATOR_VERSION,
+        vendor_fingerprint(options.vendor_dir) if options.vendor_dir else None,
+    ]
+    return sha256_data(json.dumps(key))
+
+
+def load_manifest() -> dict:
+    try:
+        with open(os.path.join(OUT_DIR, MANIFEST_NAME), encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {"templates": {}, "pages": {}}
+    manifest.setdefault("templates", {})
+    manifest.setdefault("pages", {})
+    return manifest
+
+
+def save_manifest(manifest: dict):
+    path = os.path.join(OUT_DIR, MANIFEST_NAME)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(tmp, path)
+    note_write(path)
+
+
+def is_up_to_date(folder: str, in_hash: str, manifest: dict) -> bool:
+    entry = manifest["templates"].get(folder)
+    if not entry or entry.get("input") != in_hash:
+        return False
+    out_path = os.path.join(OUT_DIR, folder)
+    return all(file_digest(os.path.join(out_path, name)) == digest for name, digest in entry["files"].items())
+
+
+# Set while an --atomic generation is staged: every path written goes in, and
+# publish() fsyncs exactly those. Writer threads only ever add to it.
+STAGED_WRITES = None
+
+
+def note_write(path: str):
+    if STAGED_WRITES is not None:
+        STAGED_WRITES.add(path)
+
+
+def write_file(path: str, data):
+    # Replace rather than rewrite in place, so anything still holding the old file
+    # (a reader, or a hard-linked older generation) keeps the old content.
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
+    note_write(path)
+    if isinstance(data, bytes):
+        with open(path, "wb") as f:
+            f.write(data)
+        return
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(data)
+
+
+def write_if_changed(path: str, data, force: bool = False) -> tuple:
+    digest = sha256_data(data)
+    if not force and file_digest(path) == digest:
+        return False, digest
+    write_file(path, data)
+    return True, digest
+
+
+def write_stream_if_changed(path: str, chunks, force: bool = False) -> tuple:
+    # write_if_changed for text produced piecewise: streams into a sibling temp
+    # file and only moves it into place when the content differs.
+    digest = hashlib.sha256()
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        for chunk in chunks:
+            digest.update(chunk.encode("utf-8"))
+            f.write(chunk)
+    digest = digest.hexdigest()
+    if not force and file_digest(path) == digest:
+        os.remove(tmp)
+        return False, digest
+    os.replace(tmp, path)
+    note_write(path)
+    return True, digest
+
+
+def write_template(folder: str, files: list, force: bool = False) -> tuple:
+    out_path = os.path.join(OUT_DIR, folder)
+    with span("write", "io", folder=folder):
+        ensure_dir(out_path)
+        written = 0
+        digests = {}
+        for name, data in files:
+            changed, digests[name] = write_if_changed(os.path.join(out_path, name), data, force)
+            written += changed
+    return written, digests
+
+
+WRITE_BATCH = 16
+
+
+def write_templates(batch, force: bool = False) -> list:
+    # One writer task per batch of rendered templates.
+    return [write_template(rendered.folder, rendered.files, force) for rendered in batch]
+
+
+class BuildStats:
+    def __init__(self):
+        self.rendered = 0
+        self.skipped = 0
+        self.files_written = 0
+        self.reports = {}
+
+
+def generate(jobs: int = 1, force: bool = False, manifest: dict = None, stats: BuildStats = None,
+             options: BuildOptions = DEFAULT_OPTIONS, catalog=None, gallery: Gallery = None) -> Gallery:
+    # Brands are consumed one at a time from the catalog (the built-in list when
+    # None); the connector cards they produce are collected in the gallery.
+    manifest = manifest if manifest is not None else {"templates": {}, "pages": {}}
+    stats = stats or BuildStats()
+    gallery = gallery or Gallery(options.minify)
+    hashes = {}
+    seen = set()
+
+    def pending():
+        for i, brand in enumerate(default_catalog() if catalog is None else catalog):
+            folder = template_folder(i, brand.slug)
+            seen.add(folder)
+            gallery.add(folder, brand.brand, brand.slug, theme_for(i, brand))
+            in_hash = input_hash(i, brand, options)
+            if not force and is_up_to_date(folder, in_hash, manifest):
+                stats.skipped += 1
+                continue
+            hashes[folder] = in_hash
+            yield i, brand, options
+
+    def record(rendered, result):
+        written, digests = result
+        stats.rendered += 1
+        stats.files_written += written
+        if rendered.report:
+            stats.reports[rendered.folder] = rendered.report
+        manifest["templates"][rendered.folder] = {"input": hashes.pop(rendered.folder), "files": digests}
+
+    seen_shared = set()
+
+    def write_shared(shared):
+        for rel, data in shared:
+            if rel in seen_shared:
+                continue
+            seen_shared.add(rel)
+            ensure_dir(os.path.dirname(os.path.join(OUT_DIR, rel)))
+            changed, manifest["pages"][rel] = write_if_changed(os.path.join(OUT_DIR, rel), data, force)
+            stats.files_written += changed
+
+    if jobs <= 1 and PROFILER is not None:
+        # Spans keep one stack per recorder, so profiled builds write inline.
+        for rendered in render_templates(pending()):
+            write_shared(rendered.shared)
+            record(rendered, write_template(rendered.folder, rendered.files, force))
+    else:
+        # Rendering is CPU bound (process pool, or this thread with jobs=1), writing
+        # is I/O bound: templates go to writer threads WRITE_BATCH at a time, so the
+        # disk work overlaps rendering and completed batches are recorded in order.
+        workers = max(1, jobs)
+        with ThreadPoolExecutor(max_workers=workers) as io_pool:
+            writes = deque()
+
+            def drain(batch, fut):
+                for rendered, result in zip(batch, fut.result()):
+                    record(rendered, result)
+
+            for batch in _batched(render_templates(pending(), jobs), WRITE_BATCH):
+                for rendered in batch:
+                    write_shared(rendered.shared)
+                writes.append((batch, io_pool.submit(write_templates, batch, force)))
+                if len(writes) >= workers * 2:
+                    drain(*writes.popleft())
+            while writes:
+                drain(*writes.popleft())
+    # Templates that left the catalog are no longer built, precompressed or audited.
+    for folder in set(manifest["templates"]) - seen:
+        del manifest["templates"][folder]
+    return gallery
+
+COMPRESSORS = {
+    "gz": lambda data: gzip.compress(data, compresslevel=9, mtime=0),
+    "br": lambda data: brotli.compress(data, quality=11),
+}
+
+
+def output_paths(manifest: dict) -> list:
+    paths = [os.path.join(OUT_DIR, name) for name in manifest["pages"]]
+    for folder, entry in manifest["templates"].items():
+        paths.extend(os.path.join(OUT_DIR, folder, name) for name in entry["files"])
+    return [p for p in paths if os.path.exists(p)]
+
+
+def is_stale(path: str, sibling: str) -> bool:
+    try:
+        return os.path.getmtime(sibling) < os.path.getmtime(path)
+    except FileNotFoundError:
+        return True
+
+
+def precompress_file(path: str, formats: tuple) -> tuple:
+    with open(path, "rb") as f:
+        data = f.read()
+    sizes = {"raw": len(data)}
+    for ext in formats:
+        packed = COMPRESSORS[ext](data)
+        write_file(f"{path}.{ext}", packed)
+        sizes[ext] = len(packed)
+    return path, sizes
+
+
+def precompress(paths: list, formats: tuple, jobs: int = 1) -> list:
+    # Only files whose .gz/.br siblings are missing or older than the raw file.
+    todo = [p for p in paths if any(is_stale(p, f"{p}.{ext}") for ext in formats)]
+    # zlib and brotli release the GIL, so threads are enough here.
+    with ThreadPoolExecutor(max_workers=max(1, jobs)) as pool:
+        return list(pool.map(lambda p: precompress_file(p, formats), todo))
+
+
+def print_size_table(rows: list, formats: tuple):
+    if not rows:
+        print("Precompressed 0 files (all up to date)")
+        return
+    header = f"{'file':<48} {'raw':>9}" + "".join(f" {ext:>9}" for ext in formats)
+    print(header)
+    print("-" * len(header))
+    totals = dict.fromkeys(("raw",) + formats, 0)
+    for path, sizes in sorted(rows):
+        print(f"{os.path.relpath(path, OUT_DIR):<48} {sizes['raw']:>9}" + "".join(f" {sizes[ext]:>9}" for ext in formats))
+        for key in totals:
+            totals[key] += sizes[key]
+    print("-" * len(header))
+    print(f"{f'total ({len(rows)} files)':<48} {totals['raw']:>9}" + "".join(f" {totals[ext]:>9}" for ext in formats))
+
+
+def print_minify_report(reports: dict):
+    raw = minified = 0
+    for folder, report in sorted(reports.items()):
+        saved = report["raw"] - report["minified"]
+        print(f"{folder:<40} {report['raw']:>8} -> {report['minified']:>8} bytes  (-{saved}, {saved / report['raw']:.1%})")
+        raw += report["raw"]
+        minified += report["minified"]
+    if reports:
+        print(f"{'total':<40} {raw:>8} -> {minified:>8} bytes  (-{raw - minified}, {(raw - minified) / raw:.1%})")
+
+
+def print_prune_report(reports: dict):
+    rules = saved = 0
+    for folder, report in sorted(reports.items()):
+        print(f"{folder:<40} {report['pruned_rules']:>4} unused rules  (-{report['pruned_bytes']} bytes)")
+        rules += report["pruned_rules"]
+        saved += report["pruned_bytes"]
+    if reports:
+        print(f"{'total':<40} {rules:>4} unused rules  (-{saved} bytes)")
+
+
+def print_inline_report(reports: dict):
+    for folder, report in sorted(reports.items()):
+        print(f"{folder:<40} {report['document']:>8} bytes  ({report['document_gz']} gzipped)")
+    if reports:
+        folder, report = max(reports.items(), key=lambda item: item[1]["document"])
+        print(f"{'largest: ' + folder:<40} {report['document']:>8} bytes  ({report['document_gz']} gzipped)")
+
+
+GENERATIONS_DIR = "generations"
+CURRENT_LINK = "current"
+
+
+def link_tree(src: str, dst: str):
+    # Hard-links every file of src into dst, so unchanged outputs cost no I/O.
+    for dirpath, _, filenames in os.walk(src):
+        target = os.path.join(dst, os.path.relpath(dirpath, src))
+        ensure_dir(target)
+        for name in filenames:
+            try:
+                os.link(os.path.join(dirpath, name), os.path.join(target, name))
+            except OSError:
+                shutil.copy2(os.path.join(dirpath, name), os.path.join(target, name))
+
+
+def fsync_dir(path: str):
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def list_generations(root: str) -> list:
+    try:
+        names = os.listdir(os.path.join(root, GENERATIONS_DIR))
+    except FileNotFoundError:
+        return []
+    return sorted(name for name in names if not name.startswith("."))
+
+
+def current_generation(root: str):
+    link = os.path.join(root, CURRENT_LINK)
+    return os.path.basename(os.readlink(link)) if os.path.islink(link) else None
+
+
+def switch_current(root: str, name: str):
+    # rename(2) over the old symlink is atomic: readers see the old tree or the new one.
+    tmp = os.path.join(root, f".{CURRENT_LINK}.tmp")
+    if os.path.lexists(tmp):
+        os.unlink(tmp)
+    os.symlink(os.path.join(GENERATIONS_DIR, name), tmp)
+    os.replace(tmp, os.path.join(root, CURRENT_LINK))
+    fsync_dir(root)
+
+
+class Generation:
+    # A complete output tree built beside the live one under root/generations/ and
+    # published by swapping root/current. Files are always replaced, never
+    # rewritten in place (see write_file), so the hard links shared with the
+    # previous generation are never modified.
+    def __init__(self, root: str, keep: int = 3):
+        self.root = root
+        self.keep = max(1, keep)
+        # Sortable by start time; microseconds keep back-to-back builds apart.
+        now = time.time()
+        self.name = time.strftime("%Y%m%dT%H%M%S", time.gmtime(now)) + f".{int(now % 1 * 1e6):06d}-{os.getpid()}"
+        self.staging = os.path.join(root, GENERATIONS_DIR, f".staging-{self.name}")
+        self.written = set()
+
+    def prepare(self) -> str:
+        global STAGED_WRITES
+        ensure_dir(os.path.join(self.root, GENERATIONS_DIR))
+        previous = current_generation(self.root)
+        if previous:
+            link_tree(os.path.join(self.root, GENERATIONS_DIR, previous), self.staging)
+        ensure_dir(self.staging)
+        STAGED_WRITES = self.written = set()
+        return self.staging
+
+    def sync(self):
+        # Only what this build wrote needs flushing: hard-linked files are already
+        # durable from the previous generation. Every directory of the staged tree
+        # is new, though, so all of them (and generations/ holding it) are synced.
+        for path in sorted(self.written):
+            if os.path.exists(path):
+                fd = os.open(path, os.O_RDONLY)
+                try:
+                    os.fsync(fd)
+                finally:
+                    os.close(fd)
+        for dirpath, _, _ in os.walk(self.staging, topdown=False):
+            fsync_dir(dirpath)
+        fsync_dir(os.path.join(self.root, GENERATIONS_DIR))
+
+    def publish(self) -> str:
+        global STAGED_WRITES
+        STAGED_WRITES = None
+        self.sync()
+        final = os.path.join(self.root, GENERATIONS_DIR, self.name)
+        os.rename(self.staging, final)
+        # The rename must be on disk before current can point at it.
+        fsync_dir(os.path.dirname(final))
+        switch_current(self.root, self.name)
+        self.prune()
+        return final
+
+    def abort(self):
+        global STAGED_WRITES
+        STAGED_WRITES = None
+        shutil.rmtree(self.staging, ignore_errors=True)
+
+    def prune(self):
+        live = current_generation(self.root)
+        for name in list_generations(self.root)[:-self.keep]:
+            if name != live:
+                shutil.rmtree(os.path.join(self.root, GENERATIONS_DIR, name), ignore_errors=True)
+
+
+def rollback_main(argv):
+    parser = argparse.ArgumentParser(prog="generate_404_templates.py rollback",
+                                     description="Point the current symlink of an --atomic output back at an "
+                                                 "earlier generation.")
+    parser.add_argument("--out", default=OUT_DIR, metavar="DIR", help=f"output root (default: {OUT_DIR})")
+    parser.add_argument("--to", metavar="NAME", help="generation to activate (default: the one before current)")
+    parser.add_argument("--list", action="store_true", help="list the kept generations and exit")
+    args = parser.parse_args(argv)
+    generations = list_generations(args.out)
+    live = current_generation(args.out)
+    if args.list:
+        for name in generations:
+            print(f"{'*' if name == live else ' '} {name}")
+        return
+    if args.to:
+        if args.to not in generations:
+            sys.exit(f"error: no generation {args.to!r} under {os.path.join(args.out, GENERATIONS_DIR)}")
+        target = args.to
+    else:
+        older = [name for name in generations if live is None or name < live]
+        if not older:
+            sys.exit("error: no earlier generation to roll back to")
+        target = older[-1]
+    switch_current(args.out, target)
+    print(f"current -> {GENERATIONS_DIR}/{target} (was {live})")
+
+
+def site_pages(options: BuildOptions) -> list:
+    # Top-level files besides the streamed gallery: tutorial and any shared assets.
+    pages = [("tutorial.html", tutorial_html())]
+    if options.minify:
+        pages = [(name, minify_output(name, data)) for name, data in pages]
+    if options.shared_assets:
+        css, js = shared_assets(options.minify, options.low_power, options.service_worker)
+        pages.extend([css] if options.no_js else [css, js])
+    return pages
+
+
+def iter_site_files(jobs: int = 1, options: BuildOptions = DEFAULT_OPTIONS, formats: tuple = (), catalog=None,
+                    gallery: Gallery = None):
+    # Yields (relative path, bytes) for the whole output tree without touching disk.
+    def with_siblings(rel, data):
+        data = data if isinstance(data, bytes) else data.encode("utf-8")
+        yield rel, data
+        for ext in formats:
+            yield f"{rel}.{ext}", COMPRESSORS[ext](data)
+
+    gallery = gallery or Gallery(options.minify)
+
+    def tasks():
+        for i, brand in enumerate(default_catalog() if catalog is None else catalog):
+            gallery.add(template_folder(i, brand.slug), brand.brand, brand.slug, theme_for(i, brand))
+            yield i, brand, options
+
+    seen_shared = set()
+    try:
+        for rendered in render_templates(tasks(), jobs):
+            for rel, data in rendered.shared:
+                if rel not in seen_shared:
+                    seen_shared.add(rel)
+                    yield from with_siblings(rel, data)
+            for name, data in rendered.files:
+                yield from with_siblings(f"{rendered.folder}/{name}", data)
+        # Archive members need their size up front, so gallery files are joined here.
+        for rel, chunks in gallery.files():
+            yield from with_siblings(rel, "".join(chunks))
+    finally:
+        gallery.close()
+    for name, data in site_pages(options):
+        if name not in seen_shared:
+            yield from with_siblings(name, data)
+
+
+def write_archive(path: str, files) -> tuple:
+    # Streams (path, bytes) pairs into a .zip or .tar.gz; timestamps come from
+    # SOURCE_DATE_EPOCH when set so identical inputs give identical archives.
+    mtime = int(os.environ.get("SOURCE_DATE_EPOCH", time.time()))
+    count = size = 0
+    if path.endswith(".zip"):
+        with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED, compresslevel=9) as zf:
+            date_time = time.gmtime(max(mtime, 315532800))[:6]
+            for rel, data in files:
+                info = zipfile.ZipInfo(rel, date_time=date_time)
+                info.compress_type = zipfile.ZIP_DEFLATED
+                info.external_attr = 0o644 << 16
+                zf.writestr(info, data)
+                count += 1
+                size += len(data)
+        return count, size
+    # filename="" keeps the archive's own name out of the gzip header.
+    with open(path, "wb") as raw, gzip.GzipFile(filename="", fileobj=raw, mode="wb", compresslevel=9,
+                                                mtime=mtime) as gz, \
+            tarfile.open(fileobj=gz, mode="w|", format=tarfile.PAX_FORMAT) as tar:
+        for rel, data in files:
+            info = tarfile.TarInfo(rel)
+            info.size = len(data)
+            info.mtime = mtime
+            info.mode = 0o644
+            tar.addfile(info, BytesIO(data))
+            count += 1
+            size += len(data)
+    return count, size
+
+
+def parse_formats(value: str) -> tuple:
+    formats = tuple(dict.fromkeys(f.strip() for f in value.split(",") if f.strip()))
+    unknown = [f for f in formats if f not in COMPRESSORS]
+    if unknown:
+        raise argparse.ArgumentTypeError(f"unknown format(s): {', '.join(unknown)} (choose from gz, br)")
+    return formats
+
+
+# --- In-memory 404 server ----------------------------------------------------
+
+SERVE_PREFIX = "/__404"
+CONTENT_TYPES = {
+    ".html": "text/html; charset=utf-8",
+    ".css": "text/css; charset=utf-8",
+    ".js": "text/javascript; charset=utf-8",
+    ".json": "application/json",
+    ".woff2": "font/woff2",
+    ".woff": "font/woff",
+    ".ttf": "font/ttf",
+}
+
+
+ETAG_SUFFIXES = {"identity": "", "gzip": "-gz", "br": "-br"}
+
+
+class CachedResponse:
+    __slots__ = ("content_type", "cache_control", "etags", "bodies")
+
+    def __init__(self, name: str, data: str, cache_control: str):
+        raw = data.encode("utf-8")
+        self.content_type = CONTENT_TYPES.get(os.path.splitext(name)[1], "application/octet-stream")
+        self.cache_control = cache_control
+        self.bodies = {"identity": raw, "gzip": COMPRESSORS["gz"](raw)}
+        if brotli is not None:
+            self.bodies["br"] = COMPRESSORS["br"](raw)
+        # A strong validator names one representation, so each content-coding gets its own.
+        tag = sha256_data(raw)[:20]
+        self.etags = {encoding: f'"{tag}{ETAG_SUFFIXES[encoding]}"' for encoding in self.bodies}
+
+
+def build_page_cache(minify: bool = False, catalog=None) -> tuple:
+    # Returns ({slug: page}, {asset path: asset}); pages link their assets by absolute
+    # path because a 404 can be served under any URL. Brands are numbered and themed
+    # as generate() does, so each page matches its built template.
+    pages = {}
+    assets = {}
+    js = make_js()
+    for i, niche in enumerate(default_catalog() if catalog is None else catalog):
+        slug, brand, tagline, letter = niche[:4]
+        theme = theme_for(i, niche)
+        base = f"{SERVE_PREFIX}/{slug}"
+        files = [
+            ("index.html", make_html(i, slug, brand, tagline, letter, stylesheets=(f"{base}/style.css",),
+                                     script=f"{base}/script.js", minify=minify, theme=theme)),
+            ("style.css", make_css(i, minify, theme=theme)),
+            ("script.js", js),
+        ]
+        if minify:
+            files = [(name, minify_output(name, data)) for name, data in files]
+        pages[slug] = CachedResponse("index.html", files[0][1], "no-cache")
+        for name, data in files[1:]:
+            assets[f"{base}/{name}"] = CachedResponse(name, data, "public, max-age=3600")
+    return pages, assets
+
+
+def negotiate_encoding(accept: str, available) -> str:
+    prefs = {}
+    for item in accept.split(","):
+        token, _, params = item.strip().partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        prefs[token.strip().lower()] = q
+    for encoding in ("br", "gzip"):
+        if encoding in available and prefs.get(encoding, prefs.get("*", 0.0)) > 0:
+            return encoding
+    return "identity"
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    if if_none_match.strip() == "*":
+        return True
+    return any(tag.strip().removeprefix("W/") == etag for tag in if_none_match.split(","))
+
+
+BAD_REQUEST = b"HTTP/1.1 400 Bad Request\r\nContent-Length: 0\r\nConnection: close\r\n\r\n"
+
+
+class NotFoundServer:
+    def __init__(self, pages: dict, assets: dict, default_slug: str, hosts: dict = None):
+        self.pages = pages
+        self.assets = assets
+        self.default_slug = default_slug
+        self.hosts = hosts or {}
+        self.requests = 0
+
+    def resolve(self, host: str, path: str) -> tuple:
+        # Returns (status, CachedResponse): assets first, then Host header, then slug prefix.
+        if path in self.assets:
+            return 200, self.assets[path]
+        host = host.split(":")[0].lower()
+        slug = self.hosts.get(host) or host.split(".")[0]
+        if slug not in self.pages:
+            first = path.lstrip("/").split("/", 1)[0]
+            slug = first if first in self.pages else self.default_slug
+        return 404, self.pages[slug]
+
+    def respond(self, method: str, headers: dict, path: str, keep_alive: bool) -> bytes:
+        status, entry = self.resolve(headers.get("host", ""), path.split("?", 1)[0])
+        encoding = negotiate_encoding(headers.get("accept-encoding", ""), entry.bodies)
+        common = [
+            f"ETag: {entry.etags[encoding]}",
+            f"Cache-Control: {entry.cache_control}",
+            "Vary: Accept-Encoding",
+            f"Connection: {'keep-alive' if keep_alive else 'close'}",
+        ]
+        # Preconditions only apply to a 2xx answer (RFC 9110 13.2.1), never to a 404 page.
+        if status == 200 and etag_matches(headers.get("if-none-match", ""), entry.etags[encoding]):
+            return ("HTTP/1.1 304 Not Modified\r\n" + "\r\n".join(common) + "\r\n\r\n").encode()
+        body = entry.bodies[encoding]
+        head = [f"HTTP/1.1 {status} {'OK' if status == 200 else 'Not Found'}",
+                f"Content-Type: {entry.content_type}", f"Content-Length: {len(body)}"] + common
+        if encoding != "identity":
+            head.append(f"Content-Encoding: {encoding}")
+        head = ("\r\n".join(head) + "\r\n\r\n").encode()
+        return head if method == "HEAD" else head + body
+
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                try:
+                    raw = await reader.readuntil(b"\r\n\r\n")
+                except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+                    break
+                lines = raw.decode("latin-1").split("\r\n")
+                parts = lines[0].split()
+                if len(parts) != 3:
+                    writer.write(BAD_REQUEST)
+                    break
+                method, path, version = parts
+                headers = {}
+                for line in lines[1:]:
+                    name, sep, value = line.partition(":")
+                    if sep:
+                        headers[name.strip().lower()] = value.strip()
+                length = headers.get("content-length", "0") or "0"
+                if not length.isdigit():
+                    writer.write(BAD_REQUEST)
+                    break
+                if int(length):
+                    try:
+                        await reader.readexactly(int(length))
+                    except (asyncio.IncompleteReadError, ConnectionError):
+                        break
+                connection = headers.get("connection", "").lower()
+                keep_alive = connection != "close" if version == "HTTP/1.1" else connection == "keep-alive"
+                self.requests += 1
+                writer.write(self.respond(method, headers, path, keep_alive))
+                await writer.drain()
+                if not keep_alive:
+                    break
+        finally:
+            writer.close()
+
+
+def make_server(minify: bool = False, domain: str = None, catalog=None) -> NotFoundServer:
+    brands = list(default_catalog() if catalog is None else catalog)
+    if not brands:
+        raise ValueError("the catalog is empty")
+    pages, assets = build_page_cache(minify, brands)
+    hosts = {f"{slug}.{domain}": slug for slug in pages} if domain else {}
+    hosts.update((brand.host, brand.slug) for brand in brands if brand.host)
+    return NotFoundServer(pages, assets, brands[0].slug, hosts)
+
+
+async def serve(server: NotFoundServer, host: str, port: int):
+    srv = await asyncio.start_server(server.handle, host, port)
+    addr = srv.sockets[0].getsockname()
+    print(f"Serving {len(server.pages)} branded 404 pages on http://{addr[0]}:{addr[1]}")
+    async with srv:
+        await srv.serve_forever()
+
+
+def serve_main(argv):
+    parser = argparse.ArgumentParser(prog="generate_404_templates.py serve",
+                                     description="Serve every brand's 404 page from an in-memory, precompressed cache.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8404)
+    parser.add_argument("--domain", help="map <slug>.<DOMAIN> Host headers to their brand")
+    parser.add_argument("--catalog", metavar="PATH",
+                        help="CSV or JSONL brand catalog (default: built-in list); its host column maps Host headers")
+    parser.add_argument("--minify", action="store_true")
+    args = parser.parse_args(argv)
+    start = time.perf_counter()
+    try:
+        server = make_server(args.minify, args.domain, iter_catalog(args.catalog) if args.catalog else None)
+    except (ValueError, OSError) as e:
+        sys.exit(f"error: {e}")
+    print(f"Rendered and compressed {len(server.pages)} pages in {time.perf_counter() - start:.3f}s")
+    try:
+        asyncio.run(serve(server, args.host, args.port))
+    except KeyboardInterrupt:
+        print(f"Stopped after {server.requests} requests")
+
+
+async def _load_worker(host: str, port: int, requests: list, latencies: list, extra: bytes):
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        for path, host_header in requests:
+            t0 = time.perf_counter()
+            writer.write(f"GET {path} HTTP/1.1\r\nHost: {host_header}\r\n".encode() + extra + b"\r\n")
+            head = await reader.readuntil(b"\r\n\r\n")
+            length = re.search(rb"(?i)content-length:\s*(\d+)", head)
+            if length:
+                await reader.readexactly(int(length.group(1)))
+            latencies.append(time.perf_counter() - t0)
+    finally:
+        writer.close()
+
+
+async def run_load(host: str, port: int, connections: int, total: int, accept_encoding: str) -> tuple:
+    slugs = [slug for slug, _, _, _ in niches]
+    extra = f"Accept-Encoding: {accept_encoding}\r\n".encode() if accept_encoding else b""
+    latencies = []
+    plans = [[(f"/missing/{n}", f"{slugs[(c + n) % len(slugs)]}.localhost")
+              for n in range(total // connections + (c < total % connections))]
+             for c in range(connections)]
+    t0 = time.perf_counter()
+    await asyncio.gather(*(_load_worker(host, port, plan, latencies, extra) for plan in plans))
+    return latencies, time.perf_counter() - t0
+
+
+def percentile(values: list, pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def loadtest_main(argv):
+    parser = argparse.ArgumentParser(prog="generate_404_templates.py loadtest",
+                                     description="Keep-alive load generator for the 404 server.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, help="target a running server (default: start one in-process)")
+    parser.add_argument("-c", "--connections", type=int, default=32)
+    parser.add_argument("-n", "--requests", type=int, default=20000)
+    parser.add_argument("--accept-encoding", default="gzip, br")
+    args = parser.parse_args(argv)
+
+    async def run():
+        srv = None
+        port = args.port
+        if port is None:
+            srv = await asyncio.start_server(make_server().handle, args.host, 0)
+            port = srv.sockets[0].getsockname()[1]
+        try:
+            return await run_load(args.host, port, args.connections, args.requests, args.accept_encoding)
+        finally:
+            if srv is not None:
+                srv.close()
+                await srv.wait_closed()
+
+    latencies, elapsed = asyncio.run(run())
+    print(f"{len(latencies)} requests over {args.connections} connections in {elapsed:.2f}s")
+    print(f"{len(latencies) / elapsed:.0f} req/s, p50 {percentile(latencies, 50) * 1000:.2f} ms, "
+          f"p99 {percentile(latencies, 99) * 1000:.2f} ms")
+
+
+# --- Watch mode --------------------------------------------------------------
+
+LIVE_RELOAD_PATH = "/__livereload"
+LIVE_RELOAD_SNIPPET = (f"<script>new EventSource('{LIVE_RELOAD_PATH}')"
+                       ".addEventListener('reload', () => location.reload());</script>")
+
+
+def load_generator(path: str = __file__):
+    # A fresh copy of this module from disk, so source edits apply without a restart.
+    spec = importlib.util.spec_from_file_location("generate_404_templates", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def file_stamp(path: str):
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+
+class DevServer:
+    # Serves templates rendered on demand from the latest generator source and
+    # catalog. Whatever the browser is looking at is re-rendered right after an
+    # edit, while the output tree is brought up to date in the background.
+    def __init__(self, options: BuildOptions, catalog_path: str = None, gallery: str = "single",
+                 out_dir: str = None):
+        self.options = options
+        self.catalog_path = catalog_path
+        self.gallery = gallery
+        self.out_dir = os.path.abspath(out_dir or OUT_DIR)
+        self.source_path = os.path.abspath(__file__)
+        self.generator = sys.modules[__name__]
+        self.brands = []
+        self.folders = {}
+        self.rendered = {}
+        self.site = {}
+        self.clients = set()
+        self.stamps = {}
+        self.building = None
+        self.build_again = False
+
+    def poll(self) -> tuple:
+        # (source changed, catalog changed) since the last call.
+        changed = []
+        for path in (self.source_path, self.catalog_path):
+            stamp = file_stamp(path) if path else None
+            changed.append(path is not None and self.stamps.get(path) != stamp)
+            self.stamps[path] = stamp
+        return tuple(changed)
+
+    def reload(self, source: bool, catalog: bool) -> bool:
+        try:
+            generator = load_generator(self.source_path) if source else self.generator
+            if catalog or source:
+                brands = list(generator.iter_catalog(self.catalog_path) if self.catalog_path
+                              else generator.default_catalog())
+        except Exception as e:  # a half-saved file must not kill the session
+            print(f"watch: keeping the previous build: {type(e).__name__}: {e}")
+            return False
+        self.generator = generator
+        self.brands = brands
+        self.folders = {generator.template_folder(i, brand.slug): i for i, brand in enumerate(brands)}
+        self.rendered.clear()
+        self.site.clear()
+        return True
+
+    def build_options(self):
+        return self.generator.BuildOptions(**asdict(self.options))
+
+    def template_files(self, folder: str) -> dict:
+        if folder not in self.rendered:
+            i = self.folders[folder]
+            rendered = self.generator.render_template(i, self.brands[i], self.build_options())
+            self.rendered[folder] = dict(rendered.files)
+            self.site.update(rendered.shared)
+        return self.rendered[folder]
+
+    def site_files(self) -> dict:
+        if "index.html" not in self.site:
+            gen = self.generator
+            options = self.build_options()
+            gallery = gen.GALLERIES[self.gallery](options.minify)
+            try:
+                for i, brand in enumerate(self.brands):
+                    gallery.add(gen.template_folder(i, brand.slug), brand.brand, brand.slug, gen.theme_for(i, brand))
+                self.site.update((rel, "".join(chunks)) for rel, chunks in gallery.files())
+            finally:
+                gallery.close()
+            self.site.update(gen.site_pages(options))
+        return self.site
+
+    def lookup(self, path: str):
+        rel = path.lstrip("/") or "index.html"
+        if rel.endswith("/"):
+            rel += "index.html"
+        folder, _, name = rel.partition("/")
+        if folder in self.folders and name:
+            return self.template_files(folder).get(name)
+        return self.site_files().get(rel)
+
+    def build(self) -> BuildStats:
+        # Incremental build of the output tree: the manifest skips unchanged
+        # templates, and only files whose content changed are rewritten.
+        gen = self.generator
+        # A reloaded module starts from its default OUT_DIR; point it at ours.
+        gen.OUT_DIR = self.out_dir
+        options = self.build_options()
+        manifest = gen.load_manifest()
+        stats = gen.BuildStats()
+        gallery = gen.generate(1, False, manifest, stats, options, iter(self.brands),
+                               gen.GALLERIES[self.gallery](options.minify))
+        try:
+            for rel, chunks in gallery.files():
+                gen.ensure_dir(os.path.dirname(os.path.join(gen.OUT_DIR, rel)))
+                changed, manifest["pages"][rel] = gen.write_stream_if_changed(os.path.join(gen.OUT_DIR, rel), chunks)
+                stats.files_written += changed
+        finally:
+            gallery.close()
+        for name, data in gen.site_pages(options):
+            gen.ensure_dir(os.path.dirname(os.path.join(gen.OUT_DIR, name)))
+            changed, manifest["pages"][name] = gen.write_if_changed(os.path.join(gen.OUT_DIR, name), data)
+            stats.files_written += changed
+        manifest["version"] = gen.GENERATOR_VERSION
+        gen.save_manifest(manifest)
+        return stats
+
+    def schedule_build(self):
+        if self.building is not None and not self.building.done():
+            self.build_again = True
+            return
+        start = time.perf_counter()
+        self.building = asyncio.get_running_loop().run_in_executor(None, self.build)
+
+        def done(fut):
+            if fut.exception() is not None:
+                print(f"watch: build failed: {fut.exception()}")
+            else:
+                stats = fut.result()
+                print(f"watch: {stats.rendered} rendered, {stats.skipped} unchanged, "
+                      f"{stats.files_written} files written in {time.perf_counter() - start:.2f}s")
+            if self.build_again:
+                self.build_again = False
+                self.schedule_build()
+
+        self.building.add_done_callback(done)
+
+    async def watch(self, interval: float):
+        while True:
+            source, catalog = self.poll()
+            if (source or catalog) and self.reload(source, catalog):
+                for queue in self.clients:
+                    queue.put_nowait("reload")
+                self.schedule_build()
+            await asyncio.sleep(interval)
+
+    async def handle(self, reader, writer):
+        try:
+            try:
+                raw = await reader.readuntil(b"\r\n\r\n")
+            except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+                return
+            parts = raw.decode("latin-1").split("\r\n", 1)[0].split()
+            path = parts[1].split("?", 1)[0] if len(parts) == 3 else "/"
+            if path == LIVE_RELOAD_PATH:
+                await self.stream_events(writer)
+                return
+            data = self.lookup(path)
+            status = "200 OK" if data is not None else "404 Not Found"
+            if data is None:
+                data = "Not found"
+            name = path if os.path.splitext(path)[1] else "index.html"
+            if isinstance(data, str):
+                if name.endswith(".html"):
+                    data = data.replace("</body>", LIVE_RELOAD_SNIPPET + "</body>")
+                data = data.encode("utf-8")
+            writer.write((f"HTTP/1.1 {status}\r\n"
+                          f"Content-Type: {CONTENT_TYPES.get(os.path.splitext(name)[1], 'application/octet-stream')}\r\n"
+                          f"Content-Length: {len(data)}\r\nCache-Control: no-store\r\nConnection: close\r\n\r\n").encode()
+                         + data)
+            await writer.drain()
+        finally:
+            writer.close()
+
+    async def stream_events(self, writer):
+        queue = asyncio.Queue()
+        self.clients.add(queue)
+        try:
+            writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\nCache-Control: no-store\r\n\r\n"
+                         b"retry: 500\n\n")
+            await writer.drain()
+            while True:
+                event = await queue.get()
+                writer.write(f"event: {event}\ndata: {time.time():.3f}\n\n".encode())
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            self.clients.discard(queue)
+
+
+def watch_main(argv):
+    parser = argparse.ArgumentParser(prog="generate_404_templates.py watch",
+                                     description="Rebuild on changes to the generator or catalog and live-reload "
+                                                 "the browser.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8405)
+    parser.add_argument("--interval", type=float, default=0.2, help="polling interval in seconds (default: 0.2)")
+    parser.add_argument("--catalog", metavar="PATH")
+    parser.add_argument("--gallery", choices=GALLERIES, default="single")
+    parser.add_argument("--minify", action="store_true")
+    parser.add_argument("--shared-assets", action="store_true")
+    parser.add_argument("--no-js", action="store_true")
+    parser.add_argument("--low-power", action="store_true")
+    parser.add_argument("--out", default=OUT_DIR, metavar="DIR",
+                        help=f"output directory kept up to date in the background (default: {OUT_DIR})")
+    args = parser.parse_args(argv)
+    options = BuildOptions(shared_assets=args.shared_assets, minify=args.minify, no_js=args.no_js,
+                           low_power=args.low_power)
+    server = DevServer(options, args.catalog, args.gallery, args.out)
+    server.poll()
+    if not server.reload(True, True):
+        sys.exit("error: the generator or catalog failed to load")
+    ensure_dir(server.out_dir)
+
+    async def run():
+        srv = await asyncio.start_server(server.handle, args.host, args.port)
+        addr = srv.sockets[0].getsockname()
+        print(f"Watching {', '.join(p for p in (server.source_path, args.catalog) if p)}; "
+              f"serving {len(server.brands)} templates on http://{addr[0]}:{addr[1]}")
+        server.schedule_build()
+        async with srv:
+            await server.watch(args.interval)
+
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
+
+
+# --- Library API for application error handlers ------------------------------
+
+
+class LRUCache:
+    # Bounded, thread-safe mapping with hit/miss counters. Values are built outside
+    # the lock; two threads missing the same key may both render it once.
+    def __init__(self, maxsize: int = 1024):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, build):
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return self._data[key]
+            self.misses += 1
+        value = build()
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+        return value
+
+    def info(self) -> dict:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "size": len(self._data), "maxsize": self.maxsize}
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.hits = self.misses = 0
+
+
+page_cache = LRUCache()
+
+
+class BrandIndex:
+    # slug -> (template index, Brand) for a catalog, numbered as generate() numbers
+    # it so rendered pages match the built tree. Build one per catalog and reuse it:
+    # it is part of the page cache key.
+    def __init__(self, catalog=None):
+        self.brands = {brand.slug: (i, brand)
+                       for i, brand in enumerate(default_catalog() if catalog is None else catalog)}
+        if not self.brands:
+            raise ValueError("the catalog is empty")
+        self.default = next(iter(self.brands))
+
+    @classmethod
+    def of(cls, catalog):
+        # None is the built-in list; a str is a catalog path; anything else an iterable of Brand.
+        if catalog is None:
+            return _default_index()
+        if isinstance(catalog, cls):
+            return catalog
+        return cls(iter_catalog(catalog) if isinstance(catalog, str) else catalog)
+
+    def __contains__(self, slug) -> bool:
+        return slug in self.brands
+
+    def lookup(self, slug: str) -> tuple:
+        try:
+            return self.brands[slug]
+        except KeyError:
+            raise KeyError(f"unknown 404 template: {slug!r}") from None
+
+
+@functools.lru_cache(maxsize=1)
+def _default_index() -> BrandIndex:
+    return BrandIndex()
+
+
+def _asset_url(slug: str, variant, name: str) -> str:
+    stem, ext = name.split(".")
+    return f"{SERVE_PREFIX}/{slug}/{stem}.{variant}.{ext}" if variant else f"{SERVE_PREFIX}/{slug}/{name}"
+
+
+# BCP 47 shaped: a 2-3 letter language plus optional subtags (en, pt-BR, zh-Hant-TW).
+LOCALE_RE = re.compile(r"[A-Za-z]{2,3}(?:-[A-Za-z0-9]{1,8}){0,4}")
+
+
+def normalize_locale(locale: str) -> str:
+    # Anything else falls back to "en": the value lands in <html lang> and in the
+    # cache key, so arbitrary request input must not reach either.
+    return locale if isinstance(locale, str) and LOCALE_RE.fullmatch(locale) else "en"
+
+
+def render_404(slug: str, variant: str = None, locale: str = None, catalog=None) -> bytes:
+    # The page's CSS/JS are linked under /__404/<slug>/; render_404_asset (or the
+    # middlewares below) serve them from the same cache. catalog is anything
+    # BrandIndex.of() takes; pass a BrandIndex to avoid re-reading it per call.
+    if variant is not None and variant not in variants:
+        raise ValueError(f"unknown variant {variant!r} (choose from {', '.join(variants)})")
+    locale = normalize_locale(locale)
+    index = BrandIndex.of(catalog)
+
+    def build():
+        i, brand = index.lookup(slug)
+        return make_html(i, brand.slug, brand.brand, brand.tagline, brand.letter, variant=variant, lang=locale,
+                         theme=theme_for(i, brand), stylesheets=(_asset_url(slug, variant, "style.css"),),
+                         script=_asset_url(slug, None, "script.js")).encode("utf-8")
+
+    return page_cache.get(("page", index, slug, variant, locale), build)
+
+
+def render_404_asset(path: str, catalog=None):
+    # Returns (bytes, content type) for a /__404/<slug>/... path, or None.
+    index = BrandIndex.of(catalog)
+    parts = path[len(SERVE_PREFIX) + 1:].split("/") if path.startswith(SERVE_PREFIX + "/") else []
+    if len(parts) != 2 or parts[0] not in index:
+        return None
+    slug, name = parts
+    if name == "script.js":
+        build = lambda: make_js().encode("utf-8")
+    else:
+        m = re.fullmatch(r"style(?:\.(\w+))?\.css", name)
+        if not m or (m.group(1) and m.group(1) not in variants):
+            return None
+
+        def build():
+            i, brand = index.lookup(slug)
+            return make_css(i, variant=m.group(1), theme=theme_for(i, brand)).encode("utf-8")
+    return page_cache.get(("asset", index, slug, name), build), CONTENT_TYPES[os.path.splitext(name)[1]]
+
+
+def cache_info() -> dict:
+    return page_cache.info()
+
+
+def _choose(value, context):
+    return value(context) if callable(value) else value
+
+
+def _middleware_page(slug, variant, locale, index: BrandIndex) -> bytes:
+    # The choices come from per-request callables; an unknown slug or variant
+    # gets the catalog's first page rather than turning the 404 into a 500.
+    try:
+        return render_404(slug, variant, locale, index)
+    except (KeyError, ValueError):
+        return render_404(index.default, None, locale, index)
+
+
+class NotFoundMiddleware:
+    # WSGI: replaces any 404 from the wrapped app with the branded page and serves
+    # its assets. slug/variant/locale may be callables taking the WSGI environ;
+    # catalog is read once, as BrandIndex.of() reads it.
+    def __init__(self, app, slug, variant=None, locale=None, catalog=None):
+        self.app = app
+        self.slug = slug
+        self.variant = variant
+        self.locale = locale
+        self.index = BrandIndex.of(catalog)
+
+    def __call__(self, environ, start_response):
+        asset = render_404_asset(environ.get("PATH_INFO", ""), self.index)
+        if asset is not None:
+            body, content_type = asset
+            start_response("200 OK", [("Content-Type", content_type), ("Content-Length", str(len(body))),
+                                      ("Cache-Control", "public, max-age=3600")])
+            return [body]
+
+        captured = {}
+
+        def capture(status, headers, exc_info=None):
+            if status.startswith("404"):
+                captured["status"] = status
+                return lambda data: None
+            return start_response(status, headers, exc_info)
+
+        result = self.app(environ, capture)
+        first = None
+        if not captured:
+            # start_response may be deferred until the first body chunk is produced.
+            iterator = iter(result)
+            first = next(iterator, None)
+        if captured:
+            if hasattr(result, "close"):
+                result.close()
+            body = _middleware_page(_choose(self.slug, environ), _choose(self.variant, environ),
+                                    _choose(self.locale, environ), self.index)
+            start_response("404 Not Found", [("Content-Type", "text/html; charset=utf-8"),
+                                             ("Content-Length", str(len(body)))])
+            return [body]
+        return self._passthrough(first, iterator, result)
+
+    @staticmethod
+    def _passthrough(first, iterator, result):
+        try:
+            if first is not None:
+                yield first
+            yield from iterator
+        finally:
+            if hasattr(result, "close"):
+                result.close()
+
+
+class ASGINotFoundMiddleware:
+    # ASGI counterpart of NotFoundMiddleware; callables receive the ASGI scope.
+    def __init__(self, app, slug, variant=None, locale=None, catalog=None):
+        self.app = app
+        self.slug = slug
+        self.variant = variant
+        self.locale = locale
+        self.index = BrandIndex.of(catalog)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        asset = render_404_asset(scope.get("path", ""), self.index)
+        if asset is not None:
+            body, content_type = asset
+            await send({"type": "http.response.start", "status": 200, "headers": [
+                (b"content-type", content_type.encode()), (b"content-length", str(len(body)).encode()),
+                (b"cache-control", b"public, max-age=3600")]})
+            await send({"type": "http.response.body", "body": body})
+            return
+
+        replaced = False
+
+        async def intercept(message):
+            nonlocal replaced
+            if message["type"] == "http.response.start" and message["status"] == 404:
+                replaced = True
+                body = _middleware_page(_choose(self.slug, scope), _choose(self.variant, scope),
+                                        _choose(self.locale, scope), self.index)
+                await send({"type": "http.response.start", "status": 404, "headers": [
+                    (b"content-type", b"text/html; charset=utf-8"), (b"content-length", str(len(body)).encode())]})
+                await send({"type": "http.response.body", "body": body})
+            elif not replaced:
+                await send(message)
+
+        await self.app(scope, receive, intercept)
+
+
+# --- Page-weight budgets ---------------------------------------------------------
+
+class Budget(NamedTuple):
+    bytes: int = 64 * 1024
+    blocking: int = 5
+    origins: int = 4
+    data_uri: int = 8 * 1024
+    nodes: int = 800
+
+
+CSS_URL_RE = re.compile(r"""url\(\s*(['"]?)(.*?)\1\s*\)""", re.S)
+CSS_IMPORT_RE = re.compile(r"@import\b")
+
+
+def url_origin(url: str):
+    # scheme://host for absolute and protocol-relative URLs, None for local ones.
+    parts = urlsplit(url.strip())
+    if parts.netloc and parts.scheme in ("", "http", "https"):
+        return f"{parts.scheme or 'https'}://{parts.netloc}"
+    return None
+
+
+class _PageAuditor(HTMLParser):
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.nodes = 0
+        self.blocking = 0
+        self.urls = []
+        self.stylesheets = []
+        self.scripts = []
+        self.css = []
+        self._in_style = False
+
+    def handle_starttag(self, tag, attrs):
+        self.nodes += 1
+        attrs = dict(attrs)
+        self.urls.extend(attrs[name] for name in ("href", "src") if attrs.get(name))
+        if attrs.get("style"):
+            self.css.append(attrs["style"])
+        rel = (attrs.get("rel") or "").lower().split()
+        if tag == "link" and "stylesheet" in rel and attrs.get("href"):
+            self.stylesheets.append(attrs["href"])
+            self.blocking += attrs.get("media", "all") != "print" and "disabled" not in attrs
+        elif tag == "script" and attrs.get("src"):
+            self.scripts.append(attrs["src"])
+            self.blocking += not ({"async", "defer"} & attrs.keys()) and attrs.get("type") != "module"
+        elif tag == "style":
+            self._in_style = True
+
+    def handle_endtag(self, tag):
+        if tag == "style":
+            self._in_style = False
+
+    def handle_data(self, data):
+        if self._in_style:
+            self.css.append(data)
+
+
+def audit_page(html: str, read_local) -> dict:
+    # Static critical-path numbers for one page. read_local(url) returns the text
+    # of a same-origin stylesheet or script, or None when it cannot be resolved.
+    page = _PageAuditor()
+    page.feed(html)
+    page.close()
+    size = len(html.encode("utf-8"))
+    css = list(page.css)
+    for url in page.stylesheets + page.scripts:
+        if url.startswith("data:") or url_origin(url):
+            continue
+        text = read_local(url)
+        if text is None:
+            continue
+        size += len(text.encode("utf-8"))
+        if url in page.stylesheets:
+            css.append(text)
+    urls = list(page.urls)
+    blocking = page.blocking
+    for text in css:
+        urls.extend(m.group(2) for m in CSS_URL_RE.finditer(text))
+        blocking += len(CSS_IMPORT_RE.findall(text))
+    data_uri = sum(len(url.encode("utf-8")) for url in urls if url.startswith("data:"))
+    origins = {origin for url in urls if not url.startswith("data:") and (origin := url_origin(url))}
+    return {"bytes": size, "blocking": blocking, "origins": len(origins), "data_uri": data_uri, "nodes": page.nodes}
+
+
+def over_budget(report: dict, budget: Budget) -> list:
+    return [name for name, limit in budget._asdict().items() if report[name] > limit]
+
+
+def audit_tree(root: str, folders=None):
+    # Yields (folder, report) for every generated template under root.
+    if folders is None:
+        folders = sorted(name for name in os.listdir(root) if name.startswith("404-"))
+    for folder in folders:
+        base = os.path.join(root, folder)
+        try:
+            with open(os.path.join(base, "index.html"), encoding="utf-8") as f:
+                html = f.read()
+        except FileNotFoundError:
+            continue
+
+        def read_local(url, base=base):
+            path = os.path.normpath(os.path.join(base, urlsplit(url).path))
+            try:
+                with open(path, encoding="utf-8", errors="replace") as f:
+                    return f.read()
+            except OSError:
+                return None
+
+        yield folder, audit_page(html, read_local)
+
+
+def audit_rendered(jobs: int = 1, options: BuildOptions = DEFAULT_OPTIONS, catalog=None):
+    # Same as audit_tree, but on freshly rendered templates that never touch disk.
+    tasks = ((i, brand, options) for i, brand in enumerate(default_catalog() if catalog is None else catalog))
+    shared = {}
+    for rendered in render_templates(tasks, jobs):
+        shared.update(rendered.shared)
+        files = {f"{rendered.folder}/{name}": data for name, data in rendered.files}
+        files.update(shared)
+
+        def read_local(url, folder=rendered.folder, files=files):
+            data = files.get(posixpath.normpath(posixpath.join(folder, urlsplit(url).path)))
+            return data.decode("utf-8", "replace") if isinstance(data, bytes) else data
+
+        yield rendered.folder, audit_page(files[f"{rendered.folder}/index.html"], read_local)
+
+
+def print_audit(results, budget: Budget) -> int:
+    # Prints one row per template and returns how many are over budget.
+    print(f"{'template':<40} {'bytes':>8} {'blocking':>8} {'origins':>7} {'data-uri':>8} {'nodes':>6}")
+    count = failed = 0
+    for folder, report in results:
+        over = over_budget(report, budget)
+        count += 1
+        failed += bool(over)
+        print(f"{folder:<40} {report['bytes']:>8} {report['blocking']:>8} {report['origins']:>7} "
+              f"{report['data_uri']:>8} {report['nodes']:>6}" + (f"  over: {', '.join(over)}" if over else ""))
+    print(f"{'budget':<40} {budget.bytes:>8} {budget.blocking:>8} {budget.origins:>7} "
+          f"{budget.data_uri:>8} {budget.nodes:>6}")
+    print(f"{failed} of {count} templates over budget")
+    return failed
+
+
+def add_budget_arguments(parser):
+    limits = Budget()
+    group = parser.add_argument_group("budget", "per-template limits (a template fails if it exceeds any)")
+    group.add_argument("--max-bytes", type=int, default=limits.bytes,
+                       help=f"HTML plus local CSS/JS bytes (default: {limits.bytes})")
+    group.add_argument("--max-blocking", type=int, default=limits.blocking,
+                       help=f"render-blocking stylesheets, scripts and @imports (default: {limits.blocking})")
+    group.add_argument("--max-origins", type=int, default=limits.origins,
+                       help=f"distinct third-party origins (default: {limits.origins})")
+    group.add_argument("--max-data-uri", type=int, default=limits.data_uri,
+                       help=f"total bytes of data: URIs in HTML and CSS (default: {limits.data_uri})")
+    group.add_argument("--max-nodes", type=int, default=limits.nodes,
+                       help=f"DOM elements (default: {limits.nodes})")
+
+
+def budget_from_args(args) -> Budget:
+    return Budget(args.max_bytes, args.max_blocking, args.max_origins, args.max_data_uri, args.max_nodes)
+
+
+def audit_main(argv):
+    parser = argparse.ArgumentParser(prog="generate_404_templates.py audit",
+                                     description="Report page weight and critical-path costs per template and "
+                                                 "fail when any template is over budget.")
+    parser.add_argument("root", nargs="?", default=OUT_DIR, help=f"output tree to audit (default: {OUT_DIR})")
+    parser.add_argument("--render", action="store_true",
+                        help="audit an in-memory render instead of the files under root")
+    parser.add_argument("-j", "--jobs", type=int, default=1)
+    parser.add_argument("--catalog", metavar="PATH")
+    parser.add_argument("--minify", action="store_true")
+    parser.add_argument("--shared-assets", action="store_true")
+    parser.add_argument("--vendor-dir", metavar="DIR")
+    add_budget_arguments(parser)
+    args = parser.parse_args(argv)
+    if args.render:
+        options = BuildOptions(shared_assets=args.shared_assets, minify=args.minify,
+                               vendor_dir=os.path.abspath(args.vendor_dir) if args.vendor_dir else None)
+        catalog = iter_catalog(args.catalog) if args.catalog else None
+        try:
+            results = audit_rendered(args.jobs if args.jobs > 0 else (os.cpu_count() or 1), options, catalog)
+            failed = print_audit(results, budget_from_args(args))
+        except CatalogError as e:
+            sys.exit(f"error: {e}")
+    else:
+        failed = print_audit(audit_tree(args.root), budget_from_args(args))
+    if failed:
+        sys.exit(f"error: {failed} template(s) over budget")
+
+
+# --- Server configs ------------------------------------------------------------
+# nginx and Caddy snippets that show each host its own prebuilt 404 page. The
+# tree is exposed under a URL prefix, and pages built with --base-href <prefix>
+# load their assets from there whatever URL the 404 was served under.
+
+SERVER_PREFIX = SERVE_PREFIX + "/"
+PREFIX_RE = re.compile(r"/(?:[A-Za-z0-9_.-]+/)*")
+HTML_CACHE = "public, max-age=300"
+HASHED_CACHE = "public, max-age=31536000, immutable"
+
+
+def server_routes(catalog, domain: str = None) -> list:
+    # (host, template folder) per brand, in catalog order.
+    routes = []
+    seen = {}
+    for i, brand in enumerate(catalog):
+        if brand.host is None and not domain:
+            raise ValueError(f"{brand.slug!r} has no host; pass --domain or add a host column to the catalog")
+        host = brand.host or f"{brand.slug}.{domain}"
+        if host in seen:
+            raise ValueError(f"host {host!r} is used by both {seen[host]!r} and {brand.slug!r}")
+        seen[host] = brand.slug
+        routes.append((host, template_folder(i, brand.slug)))
+    return routes
+
+
+def _cache_rules(prefix: str) -> list:
+    # (regex, Cache-Control) for URLs under the prefix, most specific first. Shared
+    # and vendored files carry a content hash in their name; sw.js must revalidate.
+    escaped = re.escape(prefix)
+    return [
+        (f"^{escaped}(?:{ASSETS_DIR}|{VENDOR_OUT})/", HASHED_CACHE),
+        (f"^{escaped}.+/{re.escape(SW_FILE)}$", "no-cache"),
+    ]
+
+
+def nginx_config(routes: list, root: str, prefix: str = SERVER_PREFIX) -> tuple:
+    # Returns (http-level conf, server-level conf).
+    longest = max(len(host) for host, _ in routes)
+    bucket = 64
+    while bucket < longest + 16:
+        bucket *= 2
+    width = longest + 1
+    http = [
+        "# Generated by generate_404_templates.py server-config; do not edit.",
+        "# Include from http {}; include the -locations file from every tenant server {}.",
+        f"map_hash_bucket_size {bucket};",
+        f"map_hash_max_size {max(2048, 1 << (2 * len(routes) - 1).bit_length())};",
+        "",
+        "map $host $brand_404 {",
+        "    hostnames;",
+        f"    {'default':<{width}} {routes[0][1]};",
+        *(f"    {host:<{width}} {folder};" for host, folder in routes),
+        "}",
+        "",
+        "map $uri $cache_control_404 {",
+        *(f'    "~{pattern}" "{value}";' for pattern, value in _cache_rules(prefix)),
+        f'    default "{HTML_CACHE}";',
+        "}",
+        "",
+        "open_file_cache max=10000 inactive=5m;",
+        "open_file_cache_valid 2m;",
+        "open_file_cache_min_uses 1;",
+        "open_file_cache_errors on;",
+    ]
+    server = [
+        "# Generated by generate_404_templates.py server-config; do not edit.",
+        "error_page 404 @brand_404;",
+        "",
+        "location @brand_404 {",
+        f"    root {root};",
+        "    rewrite ^ /$brand_404/index.html break;",
+        "    gzip_static on;",
+        f'    add_header Cache-Control "{HTML_CACHE}" always;',
+        "}",
+        "",
+        f"location ^~ {prefix} {{",
+        f"    alias {root}/;",
+        "    gzip_static on;",
+        "    add_header Cache-Control $cache_control_404;",
+        "}",
+    ]
+    return "\n".join(http) + "\n", "\n".join(server) + "\n"
+
+
+def caddy_config(routes: list, root: str, prefix: str = SERVER_PREFIX) -> str:
+    # A snippet to import from every tenant site block: import brand_404
+    width = max(len(host) for host, _ in routes) + 1
+    lines = [
+        "# Generated by generate_404_templates.py server-config; do not edit.",
+        "(brand_404) {",
+        "\tmap {host} {brand_404} {",
+        *(f"\t\t{host:<{width}} {folder}" for host, folder in routes),
+        f"\t\t{'default':<{width}} {routes[0][1]}",
+        "\t}",
+        "\tmap {http.request.orig_uri.path} {cache_control_404} {",
+        *(f'\t\t~{pattern} "{value}"' for pattern, value in _cache_rules(prefix)),
+        f'\t\tdefault "{HTML_CACHE}"',
+        "\t}",
+        "",
+        f"\thandle_path {prefix}* {{",
+        f"\t\troot * {root}",
+        "\t\theader Cache-Control {cache_control_404}",
+        "\t\tfile_server {",
+        "\t\t\tprecompressed br gzip",
+        "\t\t}",
+        "\t}",
+        "",
+        "\thandle_errors {",
+        "\t\t@not_found expression {err.status_code} == 404",
+        "\t\thandle @not_found {",
+        f"\t\t\troot * {root}",
+        "\t\t\trewrite * /{brand_404}/index.html",
+        f'\t\t\theader Cache-Control "{HTML_CACHE}"',
+        "\t\t\tfile_server {",
+        "\t\t\t\tprecompressed br gzip",
+        "\t\t\t\tstatus 404",
+        "\t\t\t}",
+        "\t\t}",
+        "\t}",
+        "}",
+    ]
+    return "\n".join(lines) + "\n"
+
+
+def check_routes(out_dir: str, routes: list, prefix: str = SERVER_PREFIX) -> list:
+    # Smoke test: every mapped page exists and pins its assets under the prefix.
+    problems = []
+    for host, folder in routes:
+        path = os.path.join(out_dir, folder, "index.html")
+        try:
+            with open(path, encoding="utf-8") as f:
+                html = f.read()
+        except OSError:
+            problems.append(f"{host}: {path} does not exist")
+            continue
+        if f'<base href="{prefix}{folder}/"' not in html:
+            problems.append(f"{host}: {path} was not built with --base-href {prefix}")
+    return problems
+
+
+def server_config_main(argv):
+    parser = argparse.ArgumentParser(prog="generate_404_templates.py server-config",
+                                     description="Write nginx and Caddy configs that serve each catalog host its "
+                                                 "404 page, then check every mapped page exists.")
+    parser.add_argument("--catalog", metavar="PATH", help="catalog the tree was built from (default: built-in list)")
+    parser.add_argument("--domain", help="hosts are <slug>.<DOMAIN> for brands without a host column")
+    parser.add_argument("--out", default=OUT_DIR, metavar="DIR", help=f"built output tree (default: {OUT_DIR})")
+    parser.add_argument("--root", metavar="DIR",
+                        help="where the tree lives on the server (default: the absolute --out path)")
+    parser.add_argument("--prefix", default=SERVER_PREFIX,
+                        help=f"URL prefix the tree is served under; build with the same --base-href "
+                             f"(default: {SERVER_PREFIX})")
+    parser.add_argument("--conf-dir", default="server-config", metavar="DIR",
+                        help="where to write 404-map.conf, 404-locations.conf and 404.caddy (default: server-config)")
+    args = parser.parse_args(argv)
+    if not PREFIX_RE.fullmatch(args.prefix):
+        parser.error("--prefix must be an absolute URL path ending in '/'")
+    try:
+        routes = server_routes(iter_catalog(args.catalog) if args.catalog else default_catalog(), args.domain)
+    except (ValueError, OSError) as e:
+        sys.exit(f"error: {e}")
+    if not routes:
+        sys.exit("error: the catalog is empty")
+    root = (args.root or os.path.abspath(args.out)).rstrip("/")
+    http, server = nginx_config(routes, root, args.prefix)
+    ensure_dir(args.conf_dir)
+    for name, text in (("404-map.conf", http), ("404-locations.conf", server),
+                       ("404.caddy", caddy_config(routes, root, args.prefix))):
+        with open(os.path.join(args.conf_dir, name), "w", encoding="utf-8") as f:
+            f.write(text)
+    print(f"Wrote {len(routes)} host routes to {args.conf_dir}/404-map.conf, 404-locations.conf and 404.caddy")
+    problems = check_routes(args.out, routes, args.prefix)
+    for problem in problems:
+        print(problem)
+    if problems:
+        sys.exit(f"error: {len(problems)} of {len(routes)} mapped pages failed the smoke test")
+    print(f"Smoke test passed: all {len(routes)} mapped pages exist under {args.out}")
+
+
+# --- Benchmarks ----------------------------------------------------------------
+
+BENCH_SIZES = (60, 1000, 10000)
+# Lower is better for every metric; bench-compare flags increases beyond the threshold.
+BENCH_METRICS = ("svg_us", "render_us", "write_us", "build_us", "peak_kib", "bytes_per_template", "bytes_max")
+
+
+def synthetic_catalog(count: int):
+    # The built-in brands repeated with numbered slugs, so large runs stay realistic.
+    for i in range(count):
+        slug, brand, tagline, letter = niches[i % len(niches)]
+        if i >= len(niches):
+            slug, brand = f"{slug}-{i // len(niches) + 1}", f"{brand} {i // len(niches) + 1}"
+        yield Brand(slug, brand, tagline, letter)
+
+
+def bench_stages(count: int, options: BuildOptions, out_dir: str) -> dict:
+    # Per-brand wall time of each stage, measured on one streaming pass.
+    svg = render = write = 0.0
+    sizes = []
+    for i, brand in enumerate(synthetic_catalog(count)):
+        theme = theme_for(i, brand)
+        t0 = time.perf_counter()
+        inline_favicon_data_uri.__wrapped__(theme.primary, theme.accent, brand.letter[:1] or brand.brand[0],
+                                            options.minify)
+        inline_logo_svg(theme.primary, theme.accent, brand.brand)
+        t1 = time.perf_counter()
+        rendered = render_template(i, brand, options)
+        t2 = time.perf_counter()
+        folder = os.path.join(out_dir, rendered.folder)
+        ensure_dir(folder)
+        for name, data in rendered.files:
+            write_file(os.path.join(folder, name), data)
+        t3 = time.perf_counter()
+        svg += t1 - t0
+        render += t2 - t1
+        write += t3 - t2
+        sizes.append(sum(len(data.encode("utf-8")) for _, data in rendered.files))
+    return {
+        "svg_us": svg / count * 1e6,
+        "render_us": render / count * 1e6,
+        "write_us": write / count * 1e6,
+        "bytes_per_template": sum(sizes) / count,
+        "bytes_max": max(sizes),
+    }
+
+
+def bench_build(count: int, options: BuildOptions, out_dir: str) -> dict:
+    # End-to-end generate() into an empty tree, under tracemalloc for peak memory.
+    global OUT_DIR
+    saved, OUT_DIR = OUT_DIR, out_dir
+    tracemalloc.start()
+    try:
+        t0 = time.perf_counter()
+        generate(options=options, catalog=synthetic_catalog(count)).close()
+        elapsed = time.perf_counter() - t0
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+        OUT_DIR = saved
+    return {"build_us": elapsed / count * 1e6, "peak_kib": peak / 1024}
+
+
+def run_bench(sizes, options: BuildOptions, repeat: int = 1) -> dict:
+    results = {}
+    for count in sizes:
+        runs = []
+        for _ in range(repeat):
+            with tempfile.TemporaryDirectory() as tmp:
+                runs.append(bench_stages(count, options, tmp))
+        # Timings take the best run; byte counts are deterministic.
+        row = {key: min(run[key] for run in runs) for key in runs[0]}
+        with tempfile.TemporaryDirectory() as tmp:
+            row.update(bench_build(count, options, tmp))
+        results[str(count)] = row
+        print(f"{count:>6} brands  svg {row['svg_us']:8.1f} us  render {row['render_us']:8.1f} us  "
+              f"write {row['write_us']:8.1f} us  build {row['build_us']:8.1f} us  "
+              f"peak {row['peak_kib'] / 1024:7.1f} MiB  {row['bytes_per_template']:9.0f} B/template")
+    return {
+        "generator": GENERATOR_VERSION,
+        "python": sys.version.split()[0],
+        "options": asdict(options),
+        "sizes": results,
+    }
+
+
+def compare_bench(baseline: dict, current: dict, threshold: float) -> list:
+    # Returns (size, metric, old, new, change) for every metric that got worse by
+    # more than threshold percent; prints the full comparison table.
+    regressions = []
+    for size, old_row in sorted(baseline["sizes"].items(), key=lambda item: int(item[0])):
+        new_row = current["sizes"].get(size)
+        if new_row is None:
+            continue
+        for metric in BENCH_METRICS:
+            old, new = old_row.get(metric), new_row.get(metric)
+            if not old or new is None:
+                continue
+            change = (new - old) / old * 100
+            flag = "REGRESSION" if change > threshold else ""
+            print(f"{size:>6} {metric:<20} {old:>12.1f} -> {new:>12.1f}  {change:+7.1f}%  {flag}")
+            if flag:
+                regressions.append((size, metric, old, new, change))
+    return regressions
+
+
+def parse_sizes(value: str) -> tuple:
+    try:
+        sizes = tuple(int(v) for v in value.split(",") if v.strip())
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected comma-separated brand counts, got {value!r}") from None
+    if not sizes or min(sizes) < 1:
+        raise argparse.ArgumentTypeError("brand counts must be positive")
+    return sizes
+
+
+def bench_main(argv):
+    parser = argparse.ArgumentParser(prog="generate_404_templates.py bench",
+                                     description="Time the render, favicon/logo SVG and write stages and record "
+                                                 "peak memory and output size per template.")
+    parser.add_argument("--sizes", type=parse_sizes, default=BENCH_SIZES, metavar="N,N,...",
+                        help=f"catalog sizes to run (default: {','.join(map(str, BENCH_SIZES))})")
+    parser.add_argument("--repeat", type=int, default=1, help="runs per size; timings keep the fastest")
+    parser.add_argument("--minify", action="store_true")
+    parser.add_argument("--shared-assets", action="store_true")
+    parser.add_argument("-o", "--output", default="bench-results.json", help="where to save the JSON results")
+    args = parser.parse_args(argv)
+    options = BuildOptions(shared_assets=args.shared_assets, minify=args.minify)
+    results = run_bench(args.sizes, options, max(1, args.repeat))
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=1, sort_keys=True)
+    print(f"Saved results to {args.output}")
+
+
+def bench_compare_main(argv):
+    parser = argparse.ArgumentParser(prog="generate_404_templates.py bench-compare",
+                                     description="Compare two bench result files; exits non-zero on regressions.")
+    parser.add_argument("baseline")
+    parser.add_argument("current")
+    parser.add_argument("--threshold", type=float, default=10.0,
+                        help="allowed increase per metric, in percent (default: 10)")
+    args = parser.parse_args(argv)
+    with open(args.baseline, encoding="utf-8") as f:
+        baseline = json.load(f)
+    with open(args.current, encoding="utf-8") as f:
+        current = json.load(f)
+    if baseline.get("options") != current.get("options"):
+        print(f"warning: options differ ({baseline.get('options')} vs {current.get('options')})")
+    regressions = compare_bench(baseline, current, args.threshold)
+    if regressions:
+        sys.exit(f"{len(regressions)} metric(s) regressed by more than {args.threshold:g}%")
+    print(f"No regressions beyond {args.threshold:g}%")
+
+
+COMMANDS = {
+    "serve": serve_main,
+    "loadtest": loadtest_main,
+    "watch": watch_main,
+    "rollback": rollback_main,
+    "audit": audit_main,
+    "bench": bench_main,
+    "bench-compare": bench_compare_main,
+    "server-config": server_config_main,
+}
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Generate the 404 template folders, gallery and tutorial.",
+                                     epilog=f"other commands: {', '.join(COMMANDS)} (see <command> --help)")
+    parser.add_argument("-j", "--jobs", type=int, default=1,
+                        help="worker processes used for rendering (0 = one per CPU, default: 1)")
+    parser.add_argument("--force", action="store_true",
+                        help="ignore the build manifest and re-render and rewrite every file")
+    parser.add_argument("--shared-assets", action="store_true",
+                        help="emit one content-hashed base stylesheet/script under assets/ plus a small theme.css per template")
+    parser.add_argument("--vendor-dir", metavar="DIR",
+                        help="self-host fonts and icon CSS from DIR, subset to what each template uses")
+    parser.add_argument("--minify", action="store_true",
+                        help="minify HTML/CSS/JS (including inline SVG data URIs) and report bytes saved")
+    parser.add_argument("--precompress", type=parse_formats, default=(), metavar="gz,br",
+                        help="write .gz and/or .br siblings next to every changed output file")
+    parser.add_argument("--catalog", metavar="PATH",
+                        help="read brands from a CSV (with header) or JSONL file instead of the built-in list")
+    parser.add_argument("--no-js", action="store_true",
+                        help="zero-JS pages: CSS countdown and controls, meta refresh redirect, no script.js")
+    parser.add_argument("--redirect", default="/", metavar="URL",
+                        help="where --no-js pages send visitors when the countdown ends ('' to disable, default: /)")
+    parser.add_argument("--low-power", action="store_true",
+                        help="add static, filter-free decor used under prefers-reduced-motion/-transparency "
+                             "or <html class=\"low-power\">")
+    parser.add_argument("--prune-css", action="store_true",
+                        help="drop style.css rules whose selectors cannot match that page's HTML (or classes its "
+                             "script may add) and report what was removed")
+    parser.add_argument("--service-worker", action="store_true",
+                        help=f"add a {SW_FILE} to every template that precaches the page and its assets under a "
+                             "build-hashed cache and serves them cache-first. Its scope is the template folder, so "
+                             "it only serves visits to that folder URL, not 404s a server shows for other URLs")
+    parser.add_argument("--base-href", metavar="PREFIX",
+                        help="add <base href=\"PREFIX<folder>/\"> to every page so its relative assets still load "
+                             f"when a server shows it as the error page for any URL (see server-config; e.g. "
+                             f"{SERVER_PREFIX})")
+    parser.add_argument("--inline", action="store_true",
+                        help="single-file pages: inline style.css and script.js (and vendored fonts as data: URIs "
+                             "with --vendor-dir) into index.html and report each document's size")
+    parser.add_argument("--inline-icons", action="store_true",
+                        help="with --inline and --vendor-dir, replace icon font glyphs with the icons' own SVGs")
+    parser.add_argument("--gallery", choices=GALLERIES, default="single",
+                        help="connector layout: one page with every card, or 'paged' JSON pages loaded on scroll "
+                             f"with a search index under {GALLERY_DIR}/ (default: single)")
+    parser.add_argument("--audit", action="store_true",
+                        help="check every template against the page-weight budget and fail the build if any is over")
+    parser.add_argument("--out", default=OUT_DIR, metavar="DIR", help=f"output directory (default: {OUT_DIR})")
+    parser.add_argument("--atomic", action="store_true",
+                        help=f"build into a staging copy under DIR/{GENERATIONS_DIR}/ and publish it by swapping "
+                             f"the DIR/{CURRENT_LINK} symlink")
+    parser.add_argument("--keep", type=int, default=3, metavar="N",
+                        help="with --atomic, generations to keep for rollback (default: 3)")
+    parser.add_argument("--profile", metavar="TRACE.json",
+                        help="render serially and write a Chrome trace of per-stage and per-template spans with "
+                             "allocation peaks, then print the hottest functions")
+    parser.add_argument("--archive", metavar="PATH",
+                        help="stream the whole output tree into PATH (.zip, .tar.gz or .tgz) instead of OUT_DIR")
+    add_budget_arguments(parser)
+    args = parser.parse_args(argv)
+    if args.archive and not args.archive.endswith((".zip", ".tar.gz", ".tgz")):
+        parser.error("--archive must end in .zip, .tar.gz or .tgz")
+    if "br" in args.precompress and brotli is None:
+        parser.error("--precompress br requires the 'brotli' package (pip install brotli)")
+    if args.service_worker and args.no_js:
+        parser.error("--service-worker is registered by the page script and cannot be combined with --no-js")
+    if args.base_href is not None and not args.base_href.endswith("/"):
+        parser.error("--base-href must end in '/'")
+    if args.inline and (args.shared_assets or args.service_worker):
+        parser.error("--inline writes one file per template and cannot be combined with --shared-assets "
+                     "or --service-worker")
+    if args.inline_icons and not (args.inline and args.vendor_dir):
+        parser.error("--inline-icons needs --inline and --vendor-dir (for the icon SVGs)")
+    if args.prune_css and args.shared_assets:
+        parser.error("--prune-css works on per-page style.css and cannot be combined with --shared-assets")
+    return args
+
+
+def main(argv=None):
+    global OUT_DIR
+    argv = sys.argv[1:] if argv is None else list(argv)
+    if argv and argv[0] in COMMANDS:
+        return COMMANDS[argv[0]](argv[1:])
+    args = parse_args(argv)
+    jobs = args.jobs if args.jobs > 0 else (os.cpu_count() or 1)
+    vendor_dir = os.path.abspath(args.vendor_dir) if args.vendor_dir else None
+    options = BuildOptions(shared_assets=args.shared_assets, vendor_dir=vendor_dir, minify=args.minify,
+                           no_js=args.no_js, redirect=args.redirect if args.no_js else DEFAULT_OPTIONS.redirect,
+                           low_power=args.low_power, prune_css=args.prune_css,
+                           service_worker=args.service_worker, base_href=args.base_href, inline=args.inline,
+                           inline_icons=args.inline_icons)
+    catalog = None
+    if args.catalog:
+        # Validate the whole file up front (streaming, constant memory) so a bad
+        # row is reported before anything is written.
+        try:
+            count = sum(1 for _ in iter_catalog(args.catalog))
+        except (CatalogError, OSError) as e:
+            sys.exit(f"error: {e}")
+        catalog = iter_catalog(args.catalog)
+    else:
+        count = len(niches)
+    if vendor_dir:
+        # Same for the vendor tree: a missing font or icon fails here, not mid-build.
+        brands = iter_catalog(args.catalog) if args.catalog else default_catalog()
+        missing = missing_vendor_files(vendor_dir, brands, icons=not args.inline_icons)
+        if missing:
+            sys.exit(f"error: {len(missing)} file(s) missing from --vendor-dir {vendor_dir}: "
+                     + ", ".join(missing[:5]) + (", ..." if len(missing) > 5 else ""))
+
+    if args.profile:
+        # Spans and allocation peaks are recorded in this process only.
+        jobs = 1
+
+    start = time.perf_counter()
+    with profiling(args.profile) if args.profile else contextlib.nullcontext():
+        if args.archive:
+            return build_archive(args, jobs, options, catalog, count, start)
+        OUT_DIR = os.path.abspath(args.out)
+        generation = Generation(OUT_DIR, args.keep) if args.atomic else None
+        if generation is not None:
+            OUT_DIR = generation.prepare()
+        try:
+            build_tree(args, jobs, options, catalog, start)
+        except BaseException:
+            if generation is not None:
+                generation.abort()
+            raise
+        if generation is not None:
+            with span("publish"):
+                published = generation.publish()
+            print(f"Published {os.path.relpath(published, generation.root)} as "
+                  f"{os.path.join(generation.root, CURRENT_LINK)}")
+
+
+def build_archive(args, jobs: int, options: BuildOptions, catalog, count: int, start: float):
+    if args.audit:
+        results = audit_rendered(jobs, options, iter_catalog(args.catalog) if args.catalog else None)
+        if print_audit(results, budget_from_args(args)):
+            sys.exit("error: build is over its page-weight budget")
+    gallery = GALLERIES[args.gallery](options.minify)
+    files, size = write_archive(args.archive, iter_site_files(jobs, options, args.precompress, catalog, gallery))
+    elapsed = time.perf_counter() - start
+    print(f"Wrote {files} files ({size} bytes uncompressed) to {args.archive}")
+    print(f"{count} pages in {elapsed:.3f}s ({count / elapsed:.1f} pages/s, jobs={jobs})")
+
+
+def build_tree(args, jobs: int, options: BuildOptions, catalog, start: float):
+    ensure_dir(OUT_DIR)
+    manifest = load_manifest()
+    stats = BuildStats()
+    with span("templates"):
+        gallery = generate(jobs, args.force, manifest, stats, options, catalog,
+                           GALLERIES[args.gallery](options.minify))
+
+    # Connector
+    try:
+        with span("gallery"):
+            for rel, chunks in gallery.files():
+                ensure_dir(os.path.dirname(os.path.join(OUT_DIR, rel)))
+                changed, manifest["pages"][rel] = write_stream_if_changed(os.path.join(OUT_DIR, rel), chunks,
+                                                                          args.force)
+                stats.files_written += changed
+    finally:
+        gallery.close()
+    if options.shared_assets:
+        ensure_dir(os.path.join(OUT_DIR, ASSETS_DIR))
+    for name, data in site_pages(options):
+        changed, manifest["pages"][name] = write_if_changed(os.path.join(OUT_DIR, name), data, args.force)
+        stats.files_written += changed
+    manifest["version"] = GENERATOR_VERSION
+    save_manifest(manifest)
+    compressed = None
+    if args.precompress:
+        with span("precompress"):
+            compressed = precompress(output_paths(manifest), args.precompress, jobs)
+    elapsed = time.perf_counter() - start
+
+    print(f"Generated {gallery.count} templates, connector index.html and tutorial.html")
+    print(f"{stats.rendered} rendered, {stats.skipped} unchanged, {stats.files_written} files written")
+    print(f"{stats.rendered} pages in {elapsed:.3f}s ({stats.rendered / elapsed:.1f} pages/s, jobs={jobs})")
+    if options.minify:
+        print_minify_report(stats.reports)
+    if options.prune_css:
+        print_prune_report(stats.reports)
+    if options.inline:
+        print_inline_report(stats.reports)
+    if compressed is not None:
+        print_size_table(compressed, args.precompress)
+    if args.audit:
+        folders = sorted(manifest["templates"])
+        with span("audit"):
+            over = print_audit(audit_tree(OUT_DIR, folders), budget_from_args(args))
+        if over:
+            sys.exit("error: build is over its page-weight budget")
+
+
+if __name__ == "__main__":
+    main()
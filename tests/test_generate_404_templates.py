@@ -0,0 +1,550 @@
+import asyncio
+import os
+import re
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import generate_404_templates as g  # noqa: E402
+
+
+# --- build manifest ----------------------------------------------------------
+
+def build(catalog, manifest, **kw):
+    stats = g.BuildStats()
+    g.generate(manifest=manifest, stats=stats, catalog=catalog, **kw).close()
+    return stats
+
+
+def test_manifest_skips_unchanged_templates_and_rebuilds_the_rest(tmp_path, monkeypatch):
+    monkeypatch.setattr(g, "OUT_DIR", str(tmp_path))
+    catalog = list(g.default_catalog())[:3]
+    manifest = {"templates": {}, "pages": {}}
+    assert build(catalog, manifest).rendered == 3
+    stats = build(catalog, manifest)
+    assert (stats.rendered, stats.skipped, stats.files_written) == (0, 3, 0)
+
+    # An output edited or deleted behind the manifest's back is rebuilt.
+    first = tmp_path / g.template_folder(0, catalog[0].slug)
+    (first / "style.css").write_text("tampered", encoding="utf-8")
+    (tmp_path / g.template_folder(1, catalog[1].slug) / "index.html").unlink()
+    stats = build(catalog, manifest)
+    assert (stats.rendered, stats.skipped) == (2, 1)
+    assert (first / "style.css").read_text(encoding="utf-8") != "tampered"
+
+    # Different options are a different input; --force renders everything.
+    assert build(catalog, manifest, options=g.BuildOptions(minify=True)).rendered == 3
+    assert build(catalog, manifest, force=True, options=g.BuildOptions(minify=True)).rendered == 3
+
+
+def test_manifest_forgets_templates_that_left_the_catalog(tmp_path, monkeypatch):
+    monkeypatch.setattr(g, "OUT_DIR", str(tmp_path))
+    catalog = list(g.default_catalog())[:3]
+    manifest = {"templates": {}, "pages": {}}
+    build(catalog, manifest)
+    build(catalog[:2], manifest)
+    assert sorted(manifest["templates"]) == [g.template_folder(i, brand.slug) for i, brand in enumerate(catalog[:2])]
+
+
+# --- minifiers ---------------------------------------------------------------
+
+def test_minify_css_collapses_whitespace_and_comments():
+    css = "a  {  color: #ffffff ;\n  margin: 0.5em }\n/* note */\nb > i { padding: 0 }\n"
+    assert g.minify_css(css) == "a{color:#fff;margin:.5em}b>i{padding:0}"
+
+
+def test_minify_css_leaves_strings_alone():
+    assert g.minify_css('i::before { content: "a  ,  b"; }') == 'i::before{content:"a  ,  b"}'
+
+
+def test_minify_js_keeps_newlines_and_strings():
+    js = "const a = 1;  // note\n\n   /* block */ let s = 'x  // y';\nfoo()\n"
+    out = g.minify_js(js)
+    assert "note" not in out and "block" not in out
+    assert "'x  // y'" in out
+    # Newlines survive so automatic semicolon insertion is unchanged.
+    assert out.splitlines()[-1] == "foo()"
+
+
+def test_minify_html_keeps_inline_gaps_and_raw_text():
+    html = "<div>\n  <p>Hi  there</p>\n  <a>x</a> <a>y</a>\n<pre>  keep\n  me </pre>\n</div>"
+    out = g.minify_html(html)
+    assert "<div><p>Hi there</p>" in out
+    assert "<a>x</a> <a>y</a>" in out
+    assert "<pre>  keep\n  me </pre>" in out
+
+
+def test_minify_html_minifies_inline_style_and_script():
+    out = g.minify_html("<style>\n  a { color: red; }\n</style><script>\n  // c\n  go();\n</script>")
+    assert "<style>a{color:red}</style>" in out
+    assert "<script>go();</script>" in out
+
+
+def test_minify_output_is_stable_on_minified_input():
+    files, _, _ = g._render_files(0, g.niches[0], g.DEFAULT_OPTIONS, minify=True)
+    for name, data in files:
+        assert g.minify_output(name, data) == data
+
+
+# --- NotFoundServer ----------------------------------------------------------
+
+def exchange(server, request: bytes) -> bytes:
+    async def run():
+        reader = asyncio.StreamReader()
+        reader.feed_data(request)
+        reader.feed_eof()
+        writer = FakeWriter()
+        await server.handle(reader, writer)
+        return bytes(writer.data)
+
+    return asyncio.run(run())
+
+
+class FakeWriter:
+    def __init__(self):
+        self.data = bytearray()
+
+    def write(self, data):
+        self.data += data
+
+    async def drain(self):
+        pass
+
+    def close(self):
+        pass
+
+
+@pytest.fixture(scope="module")
+def server():
+    return g.make_server()
+
+
+@pytest.mark.parametrize("length", ["abc", "-5", "1e3"])
+def test_server_answers_400_to_malformed_content_length(server, length):
+    response = exchange(server, f"GET /x HTTP/1.1\r\nHost: a\r\nContent-Length: {length}\r\n\r\n".encode())
+    assert response.startswith(b"HTTP/1.1 400 ")
+
+
+def test_server_answers_404_page(server):
+    response = exchange(server, b"GET /missing HTTP/1.1\r\nHost: edtech.localhost\r\nConnection: close\r\n\r\n")
+    assert response.startswith(b"HTTP/1.1 404 ")
+
+
+def header(response: bytes, name: str) -> str:
+    for line in response.split(b"\r\n\r\n", 1)[0].decode("latin-1").split("\r\n")[1:]:
+        key, _, value = line.partition(":")
+        if key.lower() == name.lower():
+            return value.strip()
+    return None
+
+
+def test_server_etags_differ_per_content_coding(server):
+    asset = next(iter(server.assets))
+    plain = exchange(server, f"GET {asset} HTTP/1.1\r\nHost: a\r\nConnection: close\r\n\r\n".encode())
+    gz = exchange(server, f"GET {asset} HTTP/1.1\r\nHost: a\r\nAccept-Encoding: gzip\r\n"
+                          f"Connection: close\r\n\r\n".encode())
+    assert header(gz, "Content-Encoding") == "gzip"
+    assert header(plain, "ETag") != header(gz, "ETag")
+    again = exchange(server, f"GET {asset} HTTP/1.1\r\nHost: a\r\nAccept-Encoding: gzip\r\n"
+                             f"If-None-Match: {header(gz, 'ETag')}\r\nConnection: close\r\n\r\n".encode())
+    assert again.startswith(b"HTTP/1.1 304 ")
+    stale = exchange(server, f"GET {asset} HTTP/1.1\r\nHost: a\r\n"
+                             f"If-None-Match: {header(gz, 'ETag')}\r\nConnection: close\r\n\r\n".encode())
+    assert stale.startswith(b"HTTP/1.1 200 ")
+
+
+def test_server_ignores_if_none_match_on_404_pages(server):
+    request = "GET /missing HTTP/1.1\r\nHost: edtech.localhost\r\n{}Connection: close\r\n\r\n"
+    etag = header(exchange(server, request.format("").encode()), "ETag")
+    response = exchange(server, request.format(f"If-None-Match: {etag}\r\n").encode())
+    assert response.startswith(b"HTTP/1.1 404 ")
+    response = exchange(server, request.format("If-None-Match: *\r\n").encode())
+    assert response.startswith(b"HTTP/1.1 404 ")
+
+
+@pytest.mark.parametrize("accept, available, expected", [
+    ("gzip, deflate, br", {"br", "gzip"}, "br"),
+    ("gzip, br;q=0", {"br", "gzip"}, "gzip"),
+    ("br", {"gzip"}, "identity"),
+    ("*", {"br"}, "br"),
+    ("*;q=0, gzip", {"br", "gzip"}, "gzip"),
+    ("br;q=abc, gzip", {"br", "gzip"}, "gzip"),
+    ("", {"br", "gzip"}, "identity"),
+    ("GZIP", {"gzip"}, "gzip"),
+])
+def test_negotiate_encoding(accept, available, expected):
+    assert g.negotiate_encoding(accept, available) == expected
+
+
+# --- render_404 and middlewares ----------------------------------------------
+
+def test_render_404_rejects_injected_locale():
+    page = g.render_404("edtech", locale='en"><script>alert(1)</script>')
+    assert b"<script>alert(1)" not in page
+    assert b'<html lang="en">' in page
+
+
+def test_render_404_invalid_locales_share_one_cache_entry():
+    g.page_cache.clear()
+    for n in range(50):
+        g.render_404("edtech", locale=f"bad locale {n}")
+    assert g.cache_info()["misses"] == 1
+    assert b'<html lang="pt-BR">' in g.render_404("edtech", locale="pt-BR")
+
+
+def test_wsgi_middleware_unknown_slug_still_answers_404():
+    def app(environ, start_response):
+        start_response("404 Not Found", [("Content-Type", "text/plain")])
+        return [b"nope"]
+
+    statuses = []
+    body = b"".join(g.NotFoundMiddleware(app, slug=lambda environ: "no-such-brand")(
+        {"PATH_INFO": "/missing"}, lambda status, headers, exc_info=None: statuses.append(status)))
+    assert statuses == ["404 Not Found"]
+    assert body.startswith(b"<!doctype html>")
+
+
+def test_asgi_middleware_unknown_slug_still_answers_404():
+    async def app(scope, receive, send):
+        await send({"type": "http.response.start", "status": 404, "headers": []})
+        await send({"type": "http.response.body", "body": b"nope"})
+
+    sent = []
+
+    async def send(message):
+        sent.append(message)
+
+    asyncio.run(g.ASGINotFoundMiddleware(app, slug="no-such-brand", variant="nope")(
+        {"type": "http", "path": "/missing"}, None, send))
+    assert sent[0]["status"] == 404
+    assert sent[1]["body"].startswith(b"<!doctype html>")
+
+
+def catalog_file(tmp_path):
+    path = tmp_path / "brands.csv"
+    path.write_text("slug,brand,tagline,letter,palette,variant,host\n"
+                    "acme,Acme,Tools,A,#112233 #445566,neon,www.acme.io\n"
+                    "beta,Beta,Stuff,B,,,\n", encoding="utf-8")
+    return str(path)
+
+
+def test_render_404_serves_catalog_brands_with_their_generated_theme(tmp_path):
+    index = g.BrandIndex(g.iter_catalog(catalog_file(tmp_path)))
+    page = g.render_404("acme", catalog=index)
+    assert b'data-slug="acme"' in page and b'class="variant-neon"' in page
+    assert b'<meta name="theme-color" content="#112233" />' in page
+    assert g.render_404_asset("/__404/acme/style.css", index)[0] == g.make_css(
+        0, theme=g.theme_for(0, index.lookup("acme")[1])).encode("utf-8")
+    assert g.render_404_asset("/__404/edtech/style.css", index) is None
+    with pytest.raises(KeyError):
+        g.render_404("edtech", catalog=index)
+
+
+def test_middleware_falls_back_to_the_catalogs_first_brand(tmp_path):
+    def app(environ, start_response):
+        start_response("404 Not Found", [])
+        return [b"nope"]
+
+    middleware = g.NotFoundMiddleware(app, slug=lambda environ: environ["slug"], catalog=catalog_file(tmp_path))
+    respond = lambda slug: b"".join(middleware({"PATH_INFO": "/x", "slug": slug}, lambda *a: None))
+    assert b'data-slug="beta"' in respond("beta")
+    assert b'data-slug="acme"' in respond("edtech")
+
+
+def test_serve_maps_catalog_hosts(tmp_path):
+    server = g.make_server(domain="example.com", catalog=g.iter_catalog(catalog_file(tmp_path)))
+    assert sorted(server.pages) == ["acme", "beta"]
+    for host, slug in (("www.acme.io", "acme"), ("beta.example.com", "beta"), ("other.test", "acme")):
+        response = exchange(server, f"GET /missing HTTP/1.1\r\nHost: {host}\r\nConnection: close\r\n\r\n".encode())
+        assert response.startswith(b"HTTP/1.1 404 ") and f'data-slug="{slug}"'.encode() in response
+
+
+# --- archives ----------------------------------------------------------------
+
+def test_archives_hold_the_same_files_as_the_tree(tmp_path, monkeypatch):
+    import tarfile
+    import zipfile
+
+    monkeypatch.setattr(g, "OUT_DIR", g.OUT_DIR)
+    monkeypatch.setenv("SOURCE_DATE_EPOCH", "1700000000")
+    out = tmp_path / "out"
+    g.main(["--out", str(out), "--precompress", "gz"])
+    tree = {}
+    for dirpath, _, names in os.walk(out):
+        for name in names:
+            if not name.startswith(g.MANIFEST_NAME):
+                path = os.path.join(dirpath, name)
+                with open(path, "rb") as f:
+                    tree[os.path.relpath(path, out).replace(os.sep, "/")] = f.read()
+
+    g.main(["--archive", str(tmp_path / "site.zip"), "--precompress", "gz"])
+    with zipfile.ZipFile(tmp_path / "site.zip") as zf:
+        assert {name: zf.read(name) for name in zf.namelist()} == tree
+    for name in ("a.tar.gz", "b.tar.gz"):
+        g.main(["--archive", str(tmp_path / name), "--precompress", "gz"])
+    with tarfile.open(tmp_path / "a.tar.gz") as tar:
+        assert {m.name: tar.extractfile(m).read() for m in tar.getmembers()} == tree
+        assert {m.mtime for m in tar.getmembers()} == {1700000000}
+    # SOURCE_DATE_EPOCH makes the archive reproducible byte for byte.
+    assert (tmp_path / "a.tar.gz").read_bytes() == (tmp_path / "b.tar.gz").read_bytes()
+
+
+# --- catalogs ----------------------------------------------------------------
+
+def brand_record(**fields):
+    record = {"slug": "acme", "brand": "Acme", "tagline": "Tools", "letter": "A"}
+    record.update(fields)
+    return record
+
+
+def test_parse_brand_parses_optional_fields():
+    brand = g.parse_brand(brand_record(palette="#112233 #445566", font="Inter:wght@400;700", variant="neon",
+                                       host="www.acme.io"), "cat.csv", 2)
+    assert brand == g.Brand("acme", "Acme", "Tools", "A", ("#112233", "#445566"), "Inter:wght@400;700", "neon",
+                            "www.acme.io")
+
+
+def test_parse_brand_blank_optional_fields_are_none():
+    brand = g.parse_brand(brand_record(letter="", palette="", font=None), "cat.csv", 2)
+    assert brand.letter == "" and brand.palette is None and brand.font is None
+
+
+@pytest.mark.parametrize("fields, message", [
+    ({"slug": "Bad Slug"}, "invalid slug"),
+    ({"tagline": ""}, "missing required field 'tagline'"),
+    ({"palette": "#112233"}, "palette must be two hex colors"),
+    ({"variant": "nope"}, "unknown variant"),
+    ({"host": "WWW"}, "host must be a lowercase hostname"),
+    ({"colour": "red"}, "unknown field(s): colour"),
+    ({None: ["extra"]}, "more columns than the header"),
+])
+def test_parse_brand_rejects_bad_rows_with_line_numbers(fields, message):
+    with pytest.raises(g.CatalogError) as excinfo:
+        g.parse_brand({**brand_record(), **fields}, "cat.csv", 7)
+    assert message in str(excinfo.value)
+    assert str(excinfo.value).startswith("cat.csv:7: ")
+
+
+def test_iter_catalog_reads_csv_and_jsonl(tmp_path):
+    csv_path = tmp_path / "brands.csv"
+    csv_path.write_text('slug,brand,tagline,letter\nacme,"Acme, Inc",Tools,A\nbeta,Beta,Stuff,\n', encoding="utf-8")
+    jsonl_path = tmp_path / "brands.jsonl"
+    jsonl_path.write_text('{"slug": "acme", "brand": "Acme, Inc", "tagline": "Tools", "letter": "A"}\n\n'
+                          '{"slug": "beta", "brand": "Beta", "tagline": "Stuff"}\n', encoding="utf-8")
+    for path in (csv_path, jsonl_path):
+        brands = list(g.iter_catalog(str(path)))
+        assert [(b.slug, b.brand, b.letter) for b in brands] == [("acme", "Acme, Inc", "A"), ("beta", "Beta", "")]
+
+
+@pytest.mark.parametrize("name, text, message", [
+    ("c.csv", "slug,brand\nacme,Acme\n", "c.csv:1: header is missing column(s): tagline"),
+    ("c.csv", "slug,brand,tagline\nacme,A,T\nacme,B,T\n", "c.csv:3: duplicate slug 'acme'"),
+    ("c.jsonl", '{"slug": "acme"\n', "c.jsonl:1: invalid JSON"),
+    ("c.jsonl", '["acme"]\n', "c.jsonl:1: each line must be a JSON object"),
+])
+def test_iter_catalog_reports_the_failing_line(tmp_path, name, text, message):
+    path = tmp_path / name
+    path.write_text(text, encoding="utf-8")
+    with pytest.raises(g.CatalogError) as excinfo:
+        list(g.iter_catalog(str(path)))
+    assert str(excinfo.value).startswith(str(tmp_path / message))
+
+
+def test_catalog_text_is_escaped_in_pages_and_cards():
+    brand = g.parse_brand(brand_record(brand='<script>alert(1)</script>', tagline='Say "hi" & <b>bye</b>',
+                                       letter="<"), "cat.csv", 2)
+    page = g.make_html(0, brand.slug, brand.brand, brand.tagline, brand.letter)
+    card = g.connector_card("404-01-acme", brand.brand, brand.slug, "#000", "#fff")
+    for text in (page, card):
+        assert "<script>alert" not in text
+        assert "&lt;script&gt;alert(1)&lt;/script&gt;" in text
+    assert 'content="Say &quot;hi&quot; &amp; &lt;b&gt;bye&lt;/b&gt;"' in page
+    assert "%3C/text%3E" in page and "%3C%3C/text" not in page
+
+
+# --- paged gallery -----------------------------------------------------------
+
+def test_paged_gallery_pages_records_and_indexes_tokens():
+    import json
+
+    gallery = g.PagedGallery(page_size=2)
+    brands = list(g.default_catalog())[:5]
+    for i, brand in enumerate(brands):
+        gallery.add(g.template_folder(i, brand.slug), brand.brand, brand.slug, g.theme_for(i, brand))
+    try:
+        files = {rel: "".join(chunks) for rel, chunks in gallery.files()}
+    finally:
+        gallery.close()
+    assert sorted(files) == ["gallery/page-0001.json", "gallery/page-0002.json", "gallery/page-0003.json",
+                             "gallery/search.json", "index.html"]
+    # Only the first page is rendered as cards; the rest load from JSON.
+    assert files["index.html"].count('class="card"') == 2
+    records = [record for n in (1, 2, 3) for record in json.loads(files[f"gallery/page-{n:04d}.json"])]
+    assert [dict(zip(g.GALLERY_FIELDS, r))["slug"] for r in records] == [b.slug for b in brands]
+    index = json.loads(files["gallery/search.json"])
+    assert (index["count"], index["pageSize"]) == (5, 2)
+    for i, brand in enumerate(brands):
+        for token in brand.slug.split("-"):
+            assert i in index["tokens"][token]
+
+
+# --- zero-JS pages -----------------------------------------------------------
+
+def test_static_page_only_offers_pause_without_a_redirect():
+    redirecting = g.make_html(0, *g.niches[0], script=None, redirect="/")
+    assert 'http-equiv="refresh"' in redirecting
+    assert "cd-pause" not in redirecting and "Pause" not in redirecting
+    still = g.make_html(0, *g.niches[0], script=None, redirect="")
+    assert 'http-equiv="refresh"' not in still
+    assert "cd-pause" in still and "Pause" in still
+
+
+def test_glass_panels_get_a_real_backdrop_filter():
+    i = next(i for i, niche in enumerate(g.niches) if g.theme_for(i, niche).variant == "glass")
+    for css in (g.make_css(i), g.make_theme_css(i)):
+        assert "background: backdrop-filter" not in css
+        assert "backdrop-filter: blur(10px);" in css
+
+
+# --- prune_css ---------------------------------------------------------------
+
+def test_prune_css_drops_rules_for_missing_classes_and_ids():
+    css = ".a { color: red; }\n.b { color: blue; }\n#c, .d { z-index: 1; }\np { margin: 0; }\n"
+    out, removed = g.prune_css(css, '<p class="a" id="c">x</p>')
+    assert removed == 1
+    assert ".a {" in out and "p {" in out
+    assert ".b" not in out and ".d" not in out
+    assert "#c {" in out
+
+
+def test_prune_css_empties_groups_and_keeps_runtime_classes():
+    css = "@media (max-width: 900px) {\n  .gone { x: y; }\n}\n.low-power .a { x: y; }\n"
+    out, removed = g.prune_css(css, '<div class="a"></div>')
+    assert "@media" not in out
+    assert ".low-power .a" in out
+    assert removed == 1
+
+
+def test_prune_css_keeps_classes_the_script_may_add():
+    out, removed = g.prune_css(".dark .a { x: y; }\n", '<div class="a"></div>', "el.classList.add('dark')")
+    assert removed == 0 and ".dark .a" in out
+
+
+# --- service worker ----------------------------------------------------------
+
+def test_service_worker_precaches_the_shell_at_folder_scope():
+    options = g.BuildOptions(service_worker=True, base_href="/__404/")
+    files, _, _ = g._render_files(0, g.niches[0], options, minify=False)
+    assert "register('sw.js')" in dict(files)["script.js"]
+    sw = g.service_worker_js(g.template_folder(0, g.niches[0][0]), files)
+    assert '["./", "index.html"' in sw
+    assert "cache.match(navigate ? 'index.html'" in sw
+
+
+# --- server config -----------------------------------------------------------
+
+def test_base_href_links_do_not_resolve_into_the_template_tree():
+    from urllib.parse import urljoin
+
+    page = g.make_html(0, *g.niches[0], base_href="/__404/404-01-ai-saas/")
+    base = "https://acme.test" + re.search(r'<base href="([^"]+)"', page).group(1)
+    hrefs = re.findall(r'<a [^>]*href="([^"]*)"', page)
+    assert len(hrefs) == 11
+    for href in hrefs:
+        assert not urljoin(base, href).startswith("https://acme.test/__404/")
+
+
+
+def test_server_routes_use_catalog_hosts_then_the_domain():
+    brands = [g.Brand("acme", "Acme", "T", "A", host="www.acme.io"), g.Brand("beta", "Beta", "T", "B")]
+    assert g.server_routes(brands, "example.com") == [("www.acme.io", "404-01-acme"),
+                                                      ("beta.example.com", "404-02-beta")]
+    with pytest.raises(ValueError, match="'beta' has no host"):
+        g.server_routes(brands)
+    with pytest.raises(ValueError, match="host 'acme.example.com' is used by both 'acme' and 'acme'"):
+        g.server_routes([g.Brand("acme", "Acme", "T", "A"), g.Brand("acme", "Acme", "T", "A")], "example.com")
+
+
+def test_check_routes_flags_missing_pages_and_missing_base_href(tmp_path):
+    routes = [("a.test", "404-01-a"), ("b.test", "404-02-b"), ("c.test", "404-03-c")]
+    for folder, base in (("404-01-a", "/__404/"), ("404-02-b", None)):
+        (tmp_path / folder).mkdir()
+        (tmp_path / folder / "index.html").write_text(
+            g.make_html(0, *g.niches[0], base_href=base and f"{base}{folder}/"), encoding="utf-8")
+    problems = g.check_routes(str(tmp_path), routes)
+    assert len(problems) == 2
+    assert problems[0].startswith("b.test: ") and "was not built with --base-href /__404/" in problems[0]
+    assert problems[1].startswith("c.test: ") and problems[1].endswith("does not exist")
+
+
+# --- profiling -----------------------------------------------------------------
+
+def test_span_peaks_exclude_memory_traced_before_the_span():
+    import tracemalloc
+
+    tracemalloc.start()
+    try:
+        baseline = bytearray(4 << 20)
+        recorder = g.TraceRecorder()
+        with recorder.span("outer", "stage", {}):
+            with recorder.span("small", "stage", {}):
+                small = bytearray(64 << 10)
+            with recorder.span("large", "stage", {}):
+                large = bytearray(1 << 20)
+            del small, large
+    finally:
+        tracemalloc.stop()
+    peaks = {e["name"]: e["args"]["peak_kib"] for e in recorder.events}
+    assert 64 <= peaks["small"] < 256
+    assert 1024 <= peaks["large"] < 1400
+    assert peaks["large"] <= peaks["outer"] < 2048
+    assert len(baseline) == 4 << 20
+
+
+# --- atomic generations --------------------------------------------------------
+
+def test_atomic_build_publish_and_rollback_round_trip(tmp_path, monkeypatch, capsys):
+    monkeypatch.setattr(g, "OUT_DIR", g.OUT_DIR)
+    synced = []
+    monkeypatch.setattr(g.Generation, "sync", lambda self: synced.append(set(self.written)))
+    out = str(tmp_path)
+    current = tmp_path / g.CURRENT_LINK
+
+    g.main(["--atomic", "--out", out, "--keep", "2"])
+    first = g.current_generation(out)
+    assert (current / "index.html").is_file()
+    assert any(path.endswith(os.path.join("404-01-ai-saas", "index.html")) for path in synced[0])
+    assert g.STAGED_WRITES is None
+
+    # Nothing changed: the second generation is hard links plus the manifest and gallery.
+    g.main(["--atomic", "--out", out, "--keep", "2"])
+    second = g.current_generation(out)
+    assert second > first and g.list_generations(out) == [first, second]
+    assert not any(os.sep + "404-" in path for path in synced[1])
+    page = os.path.join(out, g.GENERATIONS_DIR, "{}", "404-01-ai-saas", "index.html")
+    assert os.path.samefile(page.format(first), page.format(second))
+
+    g.rollback_main(["--out", out])
+    assert g.current_generation(out) == first
+    g.rollback_main(["--out", out, "--to", second])
+    assert g.current_generation(out) == second
+
+    g.main(["--atomic", "--out", out, "--keep", "2"])
+    assert g.list_generations(out) == [second, g.current_generation(out)]
+    assert not any(name.startswith(".staging") for name in os.listdir(tmp_path / g.GENERATIONS_DIR))
+
+
+def test_generation_sync_flushes_written_files_and_every_staged_dir(tmp_path, monkeypatch):
+    generation = g.Generation(str(tmp_path))
+    staging = generation.prepare()
+    os.makedirs(os.path.join(staging, "a"))
+    g.write_file(os.path.join(staging, "a", "x.html"), "x")
+    flushed = []
+    monkeypatch.setattr(g.os, "fsync", lambda fd: flushed.append(os.readlink(f"/proc/self/fd/{fd}")))
+    generation.publish()
+    final = os.path.join(str(tmp_path), g.GENERATIONS_DIR, generation.name)
+    assert flushed[0] == os.path.join(staging, "a", "x.html")
+    assert {os.path.join(staging, "a"), staging, os.path.dirname(staging)} <= set(flushed)
+    assert os.path.realpath(tmp_path / g.CURRENT_LINK) == final